@@ -1,24 +1,32 @@
-import code
-from email.policy import default
-from importlib.resources import read_text
-import logging
-import os
 from pathlib import Path
 import sys
-from typing import Iterable
 
 import click
-from click import BadArgumentUsage, BadOptionUsage, BadParameter
-from click.exceptions import ClickException
 
 from . import __version__
 
 
-@click.command()
+@click.group(invoke_without_command=True)
 @click.version_option(__version__, package_name="scheme-from-python", prog_name="aexpy", message="%(prog)s v%(version)s.")
-@click.option('-f', '--file', type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path), default=None, help="Source file to evaluate.")
+@click.option('-f', '--file', type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, allow_dash=True, path_type=Path), default=None, help="Source file to evaluate, - for stdin.")
 @click.option('-e', '--expr', default=None, help="Expression to evaluate.")
-def main(expr: str | None = None, file: Path | None = None) -> None:
+@click.option('--engine', type=click.Choice(["tree", "closure"]), default="tree", show_default=True, help="Execution engine, tree-walking evaluator or compiled closures.")
+@click.option('-l', '--load', type=click.Path(exists=True, dir_okay=False, resolve_path=True, path_type=Path), multiple=True, help="Source file to evaluate into the global environment first, can be repeated.")
+@click.option('--snapshot', type=click.Path(dir_okay=False, path_type=Path), default=None, help="Restore the global environment from the snapshot file if it is up to date with the loaded files, otherwise save it after loading them.")
+@click.option('-p', '--preload', multiple=True, help="Python attribute to resolve at startup, e.g., math:sqrt, can be repeated.")
+@click.option('--expand-macros', is_flag=True, default=False, help="Expand macros ahead of time before evaluation.")
+@click.option('-O', '--optimize', is_flag=True, default=False, help="Fold constant expressions and inline small lambdas ahead of time before evaluation.")
+@click.option('--cache', is_flag=True, default=False, help="Cache parsed source files in __sfpycache__ next to them.")
+@click.option('--cache-dir', type=click.Path(file_okay=False, dir_okay=True, resolve_path=True, path_type=Path), envvar="SFPY_CACHE_DIR", default=None, help="Cache parsed source files in this directory, implies --cache.")
+@click.option('--workers', type=click.IntRange(min=0), default=None, help="Worker processes of pmap and pfor, 0 or 1 to apply serially. [default: CPU count]")
+@click.option('--profile', is_flag=True, default=False, help="Profile Scheme functions, and report to stderr.")
+@click.option('--flamegraph', type=click.Path(dir_okay=False, writable=True, path_type=Path), default=None, help="Profile Scheme functions, and write collapsed stacks for flame graphs to the file.")
+@click.option('--tier-threshold', type=click.IntRange(min=0), default=None, help="Calls before a lambda is translated into a native Python function, 0 to disable.")
+@click.option('--report-tiers', is_flag=True, default=False, help="Report lambdas translated into native Python functions.")
+@click.option('--stats', is_flag=True, default=False, help="Report hits and misses of the evaluation caches, e.g., inline caches at call sites.")
+@click.pass_context
+def main(ctx: click.Context, expr: str | None = None, file: Path | None = None, engine: str = "tree", load: tuple[Path, ...] = (), snapshot: Path | None = None, preload: tuple[str, ...] = (), expand_macros: bool = False, optimize: bool = False,
+         cache: bool = False, cache_dir: Path | None = None, workers: int | None = None, profile: bool = False, flamegraph: Path | None = None, tier_threshold: int | None = None, report_tiers: bool = False, stats: bool = False) -> None:
     """
     scheme-from-python
 
@@ -28,14 +36,97 @@ def main(expr: str | None = None, file: Path | None = None) -> None:
     """
 
     from .interpreters import Interpreter
-    interpreter = Interpreter()
+    if tier_threshold is not None:
+        from .functions import Lambda
+        Lambda.threshold = tier_threshold or None
 
-    if expr:
-        print(interpreter.interprete(expr))
-    elif file:
-        print(interpreter.interprete(file.read_text()))
+    if workers is not None:
+        from .pools import POOL
+        POOL.workers = workers
+
+    if cache or cache_dir:
+        from .caches import SourceCache
+        cache = SourceCache(cache_dir)
+    else:
+        cache = None
+
+    interpreter = Interpreter(engine, expand_macros, cache, optimize)
+    interpreter.preload(preload)
+
+    if snapshot:
+        from .snapshots import Snapshot
+        snapshot = Snapshot(snapshot)
+    if not (snapshot and snapshot.restore(interpreter, load)):
+        for source in load:
+            interpreter.stream(source)
+        if snapshot:
+            snapshot.save(interpreter, load)
+            for name, reason in snapshot.skipped.items():
+                print(f"snapshot: skipped {name}: {reason}", file=sys.stderr)
+
+    if ctx.invoked_subcommand is not None:
+        ctx.obj = interpreter
+        return
+
+    profiler = interpreter.profile() if profile or flamegraph else None
+    if profiler:
+        profiler.enable()
+
+    try:
+        if expr:
+            print(interpreter.interprete(expr))
+        elif file:
+            if str(file) == "-":
+                print(interpreter.stream(sys.stdin))
+            else:
+                print(interpreter.stream(file))
+        else:
+            interpreter.interact()
+    finally:
+        if profiler:
+            profiler.disable()
+            if profile:
+                print(profiler.report(), file=sys.stderr)
+            if flamegraph:
+                flamegraph.write_text("\n".join(profiler.collapsed()) + "\n")
+
+    if report_tiers:
+        from .translators import TRANSLATOR
+        for name in TRANSLATOR.promoted:
+            print(f"promoted: {name}", file=sys.stderr)
+        for name, reason in TRANSLATOR.rejected.items():
+            print(f"rejected: {name}: {reason}", file=sys.stderr)
+
+    if stats:
+        for kind, counters in interpreter.stats().items():
+            print(f"{kind}: " + ", ".join(f"{name} {value}" for name, value in counters.items()), file=sys.stderr)
+
+
+@main.command()
+@click.option('-s', '--socket', "path", type=click.Path(dir_okay=False, path_type=Path), default=None, help="Unix socket to listen on, stdin and stdout by default.")
+@click.option('-l', '--load', type=click.Path(exists=True, dir_okay=False, resolve_path=True, path_type=Path), multiple=True, help="Source file to evaluate into the global environment before serving, can be repeated.")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=8, show_default=True, help="Requests evaluated concurrently.")
+@click.pass_obj
+def serve(interpreter, path: Path | None = None, load: tuple[Path, ...] = (), jobs: int = 8) -> None:
+    """
+    Serve line-delimited JSON requests, e.g., {"id": 1, "expr": "(+ 1 2)"}.
+
+    Each request is evaluated in its own child of the global environment.
+    """
+
+    from .servers import Server
+    for file in load:
+        interpreter.stream(file)
+
+    server = Server(interpreter, jobs)
+    if path is None:
+        output, sys.stdout = sys.stdout, sys.stderr  # keep stdout for responses
+        try:
+            server.serveStream(sys.stdin, output)
+        finally:
+            sys.stdout = output
     else:
-        interpreter.interact()
+        server.serveSocket(str(path))
 
 
 if __name__ == '__main__':
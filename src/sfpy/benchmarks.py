@@ -0,0 +1,227 @@
+from dataclasses import asdict, dataclass, field
+import gc
+import json
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+import tracemalloc
+
+import click
+
+from .interpreters import ENGINES, Interpreter
+from .programs import Sequence
+from . import __version__
+
+
+@dataclass
+class Workload:
+    """
+    A benchmark program, `setup` is evaluated once before timing, `run` is parsed and evaluated in each iteration.
+
+    Lambdas stay interpreted unless the workload is `tiered`, so the timing covers the evaluator rather than native translations.
+    """
+
+    name: str
+    run: str
+    setup: str = ""
+    expandMacros: bool = False
+    lines: bool = False  # feed `run` line by line as the interactor does
+    tiered: bool = False  # translate hot lambdas, after `Lambda.threshold` calls
+
+
+def generated(count: int) -> str:
+    return "\n".join(["(define s 0)", *(f"(define s (+ s (* {i} 2)))" for i in range(count))])
+
+
+FIB = "(define fib (lambda (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))"
+ACK = "(define ack (lambda (m n) (if (= m 0) (+ n 1) (if (= n 0) (ack (- m 1) 1) (ack (- m 1) (ack m (- n 1)))))))"
+
+WORKLOADS: list[Workload] = [
+    Workload("fib", "(fib 15)", FIB),
+    Workload("fib-tiered", "(fib 15)", FIB, tiered=True),
+    Workload("ackermann", "(ack 2 40)", ACK),
+    Workload("ack-tiered", "(ack 2 40)", ACK, tiered=True),
+    Workload("closures", "(loop 300 0)", """
+(define adder (lambda (n) (lambda (x) (+ x n))))
+(define compose (lambda (f g) (lambda (x) (f (g x)))))
+(define loop (lambda (i acc) (if (= i 0) acc (loop (- i 1) ((compose (adder i) (adder 1)) acc)))))"""),
+    Workload("macros", "(loop 300 0)", """
+(define unless (macro (c a b) (if c b a)))
+(define twice (macro (e) (+ e e)))
+(define loop (lambda (i acc) (unless (= i 0) (loop (- i 1) (+ acc (twice i))) acc)))""", expandMacros=True),
+    Workload("interop", "(loop 300 0)",
+             "(define loop (lambda (i acc) (if (= i 0) acc (loop (- i 1) (+ acc (math:sqrt (math:fabs i)))))))"),
+    Workload("parse", generated(2000)),
+    Workload("repl", "\n".join(["(define sq", "  (lambda (x)",
+             "    (* x x)))", *(f"(sq {i})" for i in range(200))]), lines=True),
+]
+
+
+@dataclass
+class Result:
+    name: str
+    engine: str
+    iterations: int
+    parse: float  # median seconds per iteration
+    evaluate: float
+    total: float
+    opsPerSecond: float
+    peakMemory: int  # bytes, traced in a separate iteration
+    samples: list[float] = field(default_factory=list)
+
+
+def iterate(workload: Workload, interpreter: Interpreter) -> tuple[float, float]:
+    """Run one iteration, return the parsing and evaluating time."""
+
+    if workload.lines:
+        parse = evaluate = 0.0
+        reader = interpreter.parser.reader()
+        forms = []
+        for line in workload.run.splitlines():
+            start = perf_counter()
+            forms += reader.feed(line + "\n")
+            program = interpreter.transform(Sequence(forms)) if reader.complete else None
+            parse += perf_counter() - start
+            if program is not None:
+                start = perf_counter()
+                interpreter.evaluator.evaluate(program)
+                evaluate += perf_counter() - start
+                forms = []
+        return parse, evaluate
+
+    start = perf_counter()
+    program = interpreter.load(workload.run)
+    parsed = perf_counter()
+    interpreter.evaluator.evaluate(program)
+    return parsed - start, perf_counter() - parsed
+
+
+def measure(workload: Workload, engine: str, iterations: int, warmup: int = 1) -> Result:
+    from .functions import Lambda
+
+    threshold = Lambda.threshold
+    if not workload.tiered:
+        Lambda.threshold = None
+    try:
+        return timed(workload, engine, iterations, warmup)
+    finally:
+        Lambda.threshold = threshold
+
+
+def timed(workload: Workload, engine: str, iterations: int, warmup: int = 1) -> Result:
+    interpreter = Interpreter(engine, workload.expandMacros)
+    if workload.setup:
+        interpreter.interprete(workload.setup)
+
+    for _ in range(warmup):
+        iterate(workload, interpreter)
+
+    parses, evaluates = [], []
+    gc.collect()
+    for _ in range(iterations):
+        parse, evaluate = iterate(workload, interpreter)
+        parses.append(parse)
+        evaluates.append(evaluate)
+    totals = [p + e for p, e in zip(parses, evaluates)]
+
+    tracemalloc.start()
+    try:
+        iterate(workload, interpreter)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    total = statistics.median(totals)
+    return Result(workload.name, engine, iterations, statistics.median(parses), statistics.median(evaluates),
+                  total, 1 / total if total > 0 else float("inf"), peak, totals)
+
+
+STARTUP = "startup"  # the cold start of `sfpy -e`, measured in new processes
+
+
+def startup(engine: str, iterations: int, warmup: int = 1) -> Result:
+    """Measure the cold start of evaluating a trivial expression from the command line, each iteration starts a new process."""
+
+    command = [sys.executable, "-m", "sfpy", "--engine", engine, "-e", "(+ 1 2)"]
+    totals = []
+    for i in range(warmup + iterations):
+        start = perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        if i >= warmup:
+            totals.append(perf_counter() - start)
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    except ImportError:  # not available on Windows
+        peak = 0
+
+    total = statistics.median(totals)
+    return Result(STARTUP, engine, iterations, 0, total, total, 1 / total if total > 0 else float("inf"), peak, totals)
+
+
+def compare(results: list[Result], baseline: dict, threshold: float) -> list[str]:
+    """Get the regressions, results whose median time exceeds the baseline by more than the threshold ratio."""
+
+    previous = {(item["name"], item["engine"]): item for item in baseline["results"]}
+    regressions = []
+    for result in results:
+        item = previous.get((result.name, result.engine))
+        if item is None or item["total"] <= 0:
+            continue
+        ratio = result.total / item["total"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{result.name} ({result.engine}): {item['total'] * 1000:.3f} ms -> {result.total * 1000:.3f} ms ({ratio - 1:+.1%})")
+    return regressions
+
+
+def report(results: list[Result]) -> str:
+    lines = [f"{'workload':<12} {'engine':<8} {'ops/s':>10} {'parse ms':>10} {'eval ms':>10} {'peak KiB':>10}"]
+    for r in results:
+        lines.append(
+            f"{r.name:<12} {r.engine:<8} {r.opsPerSecond:>10.2f} {r.parse * 1000:>10.3f} {r.evaluate * 1000:>10.3f} {r.peakMemory / 1024:>10.1f}")
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option('-w', '--workload', "names", multiple=True, type=click.Choice([w.name for w in WORKLOADS] + [STARTUP]), help="Workload to run, can be repeated, all by default.")
+@click.option('--engine', "engines", multiple=True, type=click.Choice(ENGINES), help="Engine to run, can be repeated, all by default.")
+@click.option('-n', '--iterations', type=click.IntRange(min=1), default=5, show_default=True, help="Timed iterations of each workload.")
+@click.option('--tier-threshold', type=click.IntRange(min=0), default=None, help="Calls before a lambda of the tiered workloads is translated into a native Python function, 0 to disable.")
+@click.option('--save', type=click.Path(dir_okay=False, path_type=Path), default=None, help="Save the results as a JSON baseline.")
+@click.option('--compare', "baseline", type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None, help="Compare with a JSON baseline, and fail on regressions.")
+@click.option('--threshold', type=click.FloatRange(min=0), default=0.1, show_default=True, help="Allowed slowdown ratio against the baseline.")
+def main(names: tuple[str, ...] = (), engines: tuple[str, ...] = (), iterations: int = 5, tier_threshold: int | None = None,
+         save: Path | None = None, baseline: Path | None = None, threshold: float = 0.1) -> None:
+    """Run the benchmark workloads of sfpy."""
+
+    if tier_threshold is not None:
+        from .functions import Lambda
+        Lambda.threshold = tier_threshold or None
+
+    workloads = [w for w in WORKLOADS if not names or w.name in names]
+    results = [measure(w, engine, iterations)
+               for w in workloads for engine in engines or ENGINES]
+    if not names or STARTUP in names:
+        results += [startup(engine, iterations)
+                    for engine in engines or ENGINES]
+    print(report(results))
+
+    if save:
+        save.write_text(json.dumps({"version": __version__, "python": sys.version,
+                                    "results": [asdict(r) for r in results]}, indent=2))
+
+    if baseline:
+        regressions = compare(results, json.loads(
+            baseline.read_text()), threshold)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,18 @@
-from functools import wraps, reduce
+from functools import reduce
+import operator
 from pathlib import Path
 from typing import Callable
 
-from .exceptions import InvalidInput
+from .exceptions import Break
 
 from .evaluators import Evaluator
-from .programs import Program
-from .functions import Function, function
-from .values import EMPTY, Int, Number, Value, String
-from .tokens import LEFT
+from .programs import Atom, Combination, Program, Sequence, Symbol
+from .functions import Function, Lambda, MemoLambda, Tail, function, numeric, pure, tail
+from .macros import Macro
+from .vectors import Vector
+from . import vectors
+from .tokens import Token
+from .values import EMPTY, Float, Int, List, Number, Pair, Value, String
 
 builtins = {}
 
@@ -25,9 +29,10 @@ def builtin(name: str):
 @builtin("def")
 @builtin("define")
 def define(name: Program, value: Program, *, eval: Evaluator):
-    assert len(name) == 1, "The symbol name must be a single string."
+    assert isinstance(
+        name, Symbol), "The symbol name must be a single string."
 
-    symbol = String(name[0])
+    symbol = String(name.name)
     assert symbol.isSymbol(), "The symbol name is not valid."
 
     value = eval.evaluate(value)
@@ -37,170 +42,550 @@ def define(name: Program, value: Program, *, eval: Evaluator):
 
 
 @builtin("if")
+@tail
 def branch(predicate: Program, exprTrue: Program, exprFalse: Program, *, eval: Evaluator):
-    return eval.evaluate(exprTrue if eval.evaluate(predicate) else exprFalse)
+    return Tail(exprTrue if eval.evaluate(predicate) else exprFalse, eval)
+
+
+def getParameterList(parameters: Program) -> list[str]:
+    assert isinstance(parameters, Combination) and all(isinstance(
+        p, Symbol) for p in parameters.items), f"Parameter list {parameters} is invalid."
+
+    names = [p.name for p in parameters.items]
+    assert len(set(names)) == len(
+        names), "Parameter names contain conflicts."
+
+    return names
+
+
+def getBindings(bindings: Program, steps: bool = False) -> list[tuple[str, Program, Program | None]]:
+    """Get (name, init, step) of binding forms `((name init) ...)`, or `((name init step) ...)` if steps are allowed."""
+
+    assert isinstance(bindings, Combination), f"Binding list {bindings} is invalid."
+    result = []
+    for binding in bindings.items:
+        assert isinstance(binding, Combination) and len(binding.items) in ({2, 3} if steps else {2}) \
+            and isinstance(binding.items[0], Symbol), f"Binding {binding} is invalid."
+        name, init, *step = binding.items
+        result.append((name.name, init, step[0] if step else None))
+
+    names = [name for name, _, _ in result]
+    assert len(set(names)) == len(names), "Binding names contain conflicts."
+    return result
+
+
+def getBody(body: tuple[Program, ...]) -> Program:
+    assert body, "The body cannot be empty."
+    return body[0] if len(body) == 1 else Sequence(list(body))
+
+
+def runNative(loop: Lambda, name: str, frame: Evaluator, node: Program) -> Value | None:
+    """Translate the loop of a named let (cached on the node), and run the rest of its iterations natively, or return None if it cannot."""
+
+    from .translators import TRANSLATOR
+    native = TRANSLATOR.translate(loop, name, node if isinstance(node, Combination) else None)
+    return native(*frame.slots) if native is not None else None
+
+
+def doLambda(bindings: list[tuple[str, Program, Program | None]], test: Program, result: Program, eval: Evaluator,
+             layout) -> Lambda:
+    """Get the loop of a `do` as the named let `(let " do" ((name init) ...) (if test result (" do" step ...)))`, to be translated."""
+
+    steps = [step if step is not None else Symbol(Token(name)) for name, _, step in bindings]
+    body = Combination([Symbol(Token("if")), test, result, Combination([Symbol(Token(" do")), *steps])])
+    return Lambda([name for name, _, _ in bindings], body, eval, layout)
+
+
+@builtin("let")
+@tail
+def let(first: Program, *rest: Program, eval: Evaluator):
+    """
+    `(let ((name init) ...) body ...)` evaluates the body with the names bound to the values of the inits.
+
+    The named form `(let loop ((name init) ...) body ...)` also binds `loop` to a function of the names running
+    the body. A call to it in tail position of the body (through `if`) runs as an iteration of a Python loop,
+    rebinding the names in place in one frame; any other call is a usual function call. After `Lambda.threshold`
+    iterations, the loop is offered to the translator, as a hot lambda is.
+    """
+
+    if not isinstance(first, Symbol):
+        bindings = getBindings(first)
+        frame = eval.frame(eval.layout.child(tuple(name for name, _, _ in bindings)),
+                           [eval.evaluate(init) for _, init, _ in bindings])
+        return Tail(getBody(rest), frame)
+
+    assert len(rest) >= 2, "The named let must have bindings and a body."
+    bindings = getBindings(rest[0])
+    scope = eval.frame(eval.layout.child((first.name,)), [EMPTY])
+    loop = scope.slots[0] = Lambda(
+        [name for name, _, _ in bindings], getBody(rest[1:]), scope)
+    frame = scope.frame(loop.layout, [eval.evaluate(init) for _, init, _ in bindings])
+    branch, iterations = builtins["if"], 0
+
+    try:
+        program = loop.body
+        while True:
+            if type(program) is Sequence and program.items:
+                for item in program.items[:-1]:
+                    frame.evaluate(item)
+                program = program.items[-1]
+            if type(program) is Combination and program.items:
+                operator = frame.evaluate(program.operator)
+                if operator is loop:  # next iteration
+                    frame.slots = loop.signature.adapt(
+                        *[frame.evaluate(o) for o in program.operands])
+                    program = loop.body
+                    iterations += 1
+                    if iterations == loop.threshold and eval.translatable:
+                        result = runNative(loop, first.name, frame, loop.body)
+                        if result is not None:
+                            return result
+                    continue
+                if operator is branch and len(program.operands) == 3:
+                    predicate, exprTrue, exprFalse = program.operands
+                    program = exprTrue if frame.evaluate(predicate) else exprFalse
+                    continue
+                # called with the operator evaluated above, not a tail call, since a break in it must exit this loop
+                assert isinstance(
+                    operator, Function), f"Operator must be a function: {operator}{program.location()}"
+                if operator.signature.lazy:
+                    return operator(*program.operands, eval=frame)
+                return operator(*[frame.evaluate(o) for o in program.operands], eval=frame)
+            return frame.evaluate(program)  # not a tail call, since a break in it must exit this loop
+    except Break as ex:
+        return ex.value
+
+
+@builtin("do")
+def doLoop(bindings: Program, exit: Program, *body: Program, eval: Evaluator):
+    """
+    `(do ((name init step) ...) (test result ...) body ...)` evaluates the body until the test is true,
+    then the results. After each iteration, the names with steps are rebound in place to the values of the steps.
+    A loop without a body and with one result is offered to the translator as a named let, after `Lambda.threshold` iterations.
+    """
+
+    bindings = getBindings(bindings, steps=True)
+    assert isinstance(exit, Combination) and exit.items, f"Exit clause {exit} is invalid."
+    test, *results = exit.items
+    frame = eval.frame(eval.layout.child(tuple(name for name, _, _ in bindings)),
+                       [eval.evaluate(init) for _, init, _ in bindings])
+    steps = [(i, step) for i, (_, _, step) in enumerate(bindings) if step is not None]
+    slots, iterations = frame.slots, 0
+
+    try:
+        while not frame.evaluate(test):
+            for item in body:
+                frame.evaluate(item)
+            values = [frame.evaluate(step) for _, step in steps]  # every step sees the values of this iteration
+            for (i, _), value in zip(steps, values):
+                slots[i] = value
+            iterations += 1
+            if iterations == Lambda.threshold and eval.translatable and not body and len(results) == 1:
+                result = runNative(doLambda(bindings, test, results[0], eval, frame.layout), " do", frame, exit)
+                if result is not None:
+                    return result
+    except Break as ex:
+        return ex.value
+
+    result = EMPTY
+    for item in results:
+        result = frame.evaluate(item)
+    return result
+
+
+@builtin("while")
+def whileLoop(test: Program, *body: Program, eval: Evaluator):
+    """`(while test body ...)` evaluates the body while the test is true, and returns the last value of the body."""
+
+    result = EMPTY
+    try:
+        while eval.evaluate(test):
+            for item in body:
+                result = eval.evaluate(item)
+    except Break as ex:
+        return ex.value
+    return result
+
+
+@builtin("break")
+def breakLoop(*value: Program, eval: Evaluator):
+    """`(break)` or `(break value)` exits the innermost running loop, which returns the value (or empty)."""
+
+    assert len(value) <= 1, "Only one value can be provided."
+    raise Break(eval.evaluate(value[0]) if value else EMPTY)
 
 
-def getParameterList(parameters: Program) -> list[String]:
-    assert len(parameters) > 0 and parameters.valid(
-    ) and parameters[0] == LEFT, f"Parameter list {parameters} is invalid."
+@builtin("lam")
+@builtin("lambda")
+def lambdafunc(parameters: Program, body: Program, *, eval: Evaluator):
+    return Lambda(getParameterList(parameters), body, eval)
 
-    parameters = parameters.split()
-    assert all(
-        len(p) == 1 for p in parameters), f"Parameter list {parameters} is invalid."
-    assert len(set(p[0] for p in parameters)) == len(
-        parameters), "Parameter names contain conflicts."
 
-    parameters: list[String] = [String(p[0]) for p in parameters]
-    assert all(s.isSymbol()
-               for s in parameters), f"Parameter list {parameters} is invalid."
+def createMemoLambda(parameters: Program, body: Program, options: tuple[Program, ...], eval: Evaluator) -> MemoLambda:
+    assert len(options) <= 2, "Only the maximum size and the time to live can be provided."
+    kwargs = {}
+    if len(options) >= 1:
+        maxsize = eval.evaluate(options[0])
+        assert isinstance(maxsize, Int), "The maximum size must be an integer."
+        kwargs["maxsize"] = maxsize.raw
+    if len(options) >= 2:
+        ttl = eval.evaluate(options[1])
+        assert isinstance(ttl, Int | Float), "The time to live must be a number of seconds."
+        kwargs["ttl"] = ttl.raw
+    return MemoLambda(getParameterList(parameters), body, eval, **kwargs)
 
-    return parameters
 
+@builtin("memo-lambda")
+def memoLambda(parameters: Program, body: Program, *options: Program, eval: Evaluator):
+    return createMemoLambda(parameters, body, options, eval)
 
-@builtin("lam")
-@builtin("lambda")
-def lambdafunc(parameters: Program, body: Program, *, eval: Evaluator):
-    parameters = getParameterList(parameters)
 
-    @function
-    def raw(*args):
-        return eval.sub({str(parameter): argument for parameter, argument in zip(parameters, args)}).evaluate(body)
+@builtin("define-memo")
+def defineMemo(name: Program, parameters: Program, body: Program, *options: Program, eval: Evaluator):
+    assert isinstance(
+        name, Symbol), "The symbol name must be a single string."
 
-    raw.repr = f"( lambda ( {' '.join(p.raw for p in parameters)} ) {' '.join(body)} )"
-    raw.signature.parameters = [(Value, False)] * len(parameters)
+    symbol = String(name.name)
+    assert symbol.isSymbol(), "The symbol name is not valid."
 
-    return raw
+    return eval.symbol(symbol, createMemoLambda(parameters, body, options, eval))
 
 
-@builtin("mac")
-@builtin("macro")
-def macro(parameters: Program, body: Program):  # do not capture macro creation environment
-    parameters = getParameterList(parameters)
+@builtin("memo-stats")
+def memoStats(func: MemoLambda):
+    stats = func.stats()
+    return List((stats["hits"], stats["misses"], stats["size"]))
 
-    @function
-    def raw(*args: Program, eval: Evaluator):
-        mp = {str(parameter): argument for parameter,
-              argument in zip(parameters, args)}
-        return eval.evaluate(Program(sum((mp.get(str(token), [token]) for token in body), [])))
 
-    raw.repr = f"( macro ( {' '.join(p.raw for p in parameters)} ) {' '.join(body)} )"
-    raw.signature.parameters = [(Program, False)] * len(parameters)
+@builtin("memo-clear")
+def memoClear(func: MemoLambda):
+    func.clear()
+    return EMPTY
+
 
-    return raw
+@builtin("mac")
+@builtin("macro")
+def macro(parameters: Program, body: Program):  # do not capture macro creation environment
+    return Macro(getParameterList(parameters), body)
 
 
 @builtin("from")
+@tail
 def fromFile(file: Program, *, eval: Evaluator):
-    assert len(file) == 1, "Only one file can be provided."
-    file: Path = Path(file[0])
+    assert isinstance(file, Atom), "Only one file can be provided."
+    file: Path = Path(repr(file))
     assert file.exists() and file.is_file(), f"File '{file}' not found."
     assert eval.interpreter is not None, "No interpreter found."
-    text = file.read_text()
-    program = eval.interpreter.parser.parse(text)
-    assert program is not None, InvalidInput(text)
-    return eval.evaluate(program)
+    last = None
+    for program in eval.interpreter.forms(file):
+        if last is not None:
+            eval.evaluate(last)
+        last = program
+    return Tail(last, eval) if last is not None else EMPTY
 
 
 @builtin("syms")
 @builtin("symbols")
 def symbols(*, eval: Evaluator):
-    return eval.symbols
+    return eval.variables()
 
 
 @builtin("+")
-def add(v1: Number, v2: Number, *args: Number):
+@pure
+@numeric(operator.add)
+def add(v1: Number | Vector, v2: Number | Vector, *args: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector) or any(isinstance(v, Vector) for v in args):
+        return vectors.broadcast("+", v1, v2, *args)
     return sum(v.raw for v in [v1, v2, *args])
 
 
 @builtin("-")
-def subtract(v1: Number, v2: Number):
+@pure
+@numeric(operator.sub)
+def subtract(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("-", v1, v2)
     return v1.raw - v2.raw
 
 
 @builtin("*")
-def multiply(v1: Number, v2: Number, *args: Number):
+@pure
+@numeric(operator.mul)
+def multiply(v1: Number | Vector, v2: Number | Vector, *args: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector) or any(isinstance(v, Vector) for v in args):
+        return vectors.broadcast("*", v1, v2, *args)
     return reduce(lambda x, y: x * y, (v.raw for v in [v1, v2, *args]))
 
 
 @builtin("//")
-def divideInt(v1: Number, v2: Number):
+@pure
+@numeric(operator.floordiv)
+def divideInt(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("//", v1, v2)
     assert v2.raw != 0, "The divisor cannot be zero."
     return v1.raw // v2.raw
 
 
 @builtin("%")
-def divideInt(v1: Number, v2: Number):
+@pure
+@numeric(operator.mod)
+def divideInt(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("%", v1, v2)
     assert v2.raw != 0, "The divisor cannot be zero."
     return v1.raw % v2.raw
 
 
 @builtin("/")
-def divide(v1: Number, v2: Number):
+@pure
+@numeric(operator.truediv)
+def divide(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("/", v1, v2)
     assert v2.raw != 0, "The divisor cannot be zero."
     return v1.raw / v2.raw
 
 
 @builtin("^")
-def power(v1: Number, v2: Number):
+@pure
+@numeric(operator.pow)
+def power(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("^", v1, v2)
     return v1.raw ** v2.raw
 
 
 @builtin("max")
-def maxNum(v1: Number, v2: Number, *args: Number):
+@pure
+def maxNum(v1: Number | Vector, v2: Number | Vector, *args: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector) or any(isinstance(v, Vector) for v in args):
+        return vectors.broadcast("max", v1, v2, *args)
     return max(v.raw for v in [v1, v2, *args])
 
 
 @builtin("min")
-def minNum(v1: Number, v2: Number, *args: Number):
+@pure
+def minNum(v1: Number | Vector, v2: Number | Vector, *args: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector) or any(isinstance(v, Vector) for v in args):
+        return vectors.broadcast("min", v1, v2, *args)
     return min(v.raw for v in [v1, v2, *args])
 
 
 @builtin("<")
-def less(v1: Number, v2: Number):
+@pure
+@numeric(operator.lt)
+def less(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("<", v1, v2)
     return v1.raw < v2.raw
 
 
 @builtin("<=")
-def lessEq(v1: Number, v2: Number):
+@pure
+@numeric(operator.le)
+def lessEq(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast("<=", v1, v2)
     return v1.raw <= v2.raw
 
 
 @builtin(">")
-def greater(v1: Number, v2: Number):
+@pure
+@numeric(operator.gt)
+def greater(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast(">", v1, v2)
     return v1.raw > v2.raw
 
 
 @builtin(">=")
-def greaterEq(v1: Number, v2: Number):
+@pure
+@numeric(operator.ge)
+def greaterEq(v1: Number | Vector, v2: Number | Vector):
+    if isinstance(v1, Vector) or isinstance(v2, Vector):
+        return vectors.broadcast(">=", v1, v2)
     return v1.raw >= v2.raw
 
 
 @builtin("=")
+@pure
+@numeric(lambda x, y: type(x) is type(y) and x == y)
 def equal(v1: Value, v2: Value):
     return v1 == v2
 
 
 @builtin("!=")
+@pure
+@numeric(lambda x, y: type(x) is not type(y) or x != y)
 def notEq(v1: Value, v2: Value):
     return v1 != v2
 
 
 @builtin("not")
+@pure
 def boolNot(b: bool):
     return not b
 
 
 @builtin("and")
+@pure
 def boolAnd(b1: bool, b2: bool, *args: bool):
     return all([b1, b2, *args])
 
 
 @builtin("or")
+@pure
 def boolOr(b1: bool, b2: bool, *args: bool):
     return any([b1, b2, *args])
 
 
+@builtin("list")
+@pure
+def listFunc(*args: Value):
+    return List.boxed(args)
+
+
+@builtin("cons")
+@pure
+def cons(v1: Value, v2: Value):
+    return List.boxed((v1,), 0, v2) if isinstance(v2, List) else Pair(v1, v2)
+
+
+@builtin("car")
+@pure
+def car(v: Value):
+    if isinstance(v, List):
+        return v.first()
+    assert isinstance(v, Pair), "The argument must be a non-empty list or a pair."
+    return v.raw[0]
+
+
+@builtin("cdr")
+@pure
+def cdr(v: Value):
+    if isinstance(v, List):
+        return v.tail()
+    assert isinstance(v, Pair), "The argument must be a non-empty list or a pair."
+    return v.raw[1]
+
+
+@builtin("null?")
+@pure
+def isNull(v: Value):
+    return isinstance(v, List) and not v.size
+
+
+@builtin("list?")
+@pure
+def isList(v: Value):
+    return isinstance(v, List)
+
+
+@builtin("length")
+@pure
+def length(v: List | Vector):
+    return len(v) if isinstance(v, List) else len(v.raw)
+
+
+@builtin("range")
+def rangeList(v1: int, *args: int):
+    assert len(args) <= 2, "The number of operands must be at most 3."
+    return List(tuple(map(Int, range(v1, *args))))
+
+
+@builtin("map")
+def mapList(func: Function, items: List, *others: List, eval: Evaluator):
+    call = func.bind(eval)
+    if not others:
+        return List(tuple(map(call, items.raw)))
+    return List(tuple(map(call, items.raw, *(o.raw for o in others))))
+
+
+@builtin("pmap")
+def pmapList(func: Function, items: List, *others: List, eval: Evaluator):
+    from .pools import POOL
+    return List(POOL.map(func, zip(items.raw, *(o.raw for o in others)), eval))
+
+
+@builtin("pfor")
+def pforList(func: Function, items: List, *, eval: Evaluator):
+    from .pools import POOL
+    POOL.map(func, zip(items.raw), eval)
+    return EMPTY
+
+
+@builtin("filter")
+def filterList(func: Function, items: List, *, eval: Evaluator):
+    call = func.bind(eval)
+    return List.boxed(tuple(item for item in items.raw if call(item)))
+
+
+@builtin("fold")
+def fold(func: Function, init: Value, items: List, *, eval: Evaluator):
+    call = func.bind(eval)
+    result = init
+    for item in items.raw:
+        result = call(item, result)
+    return result
+
+
+@builtin("apply")
+def apply(func: Function, *args: Value, eval: Evaluator):
+    assert args and isinstance(args[-1], List), "The last argument must be a list."
+    return func.bind(eval)(*args[:-1], *args[-1].raw)
+
+
+@builtin("vector")
+def vector(*args: Number):
+    return vectors.create(v.raw for v in args)
+
+
+@builtin("vector-range")
+def vectorRange(v1: Number, *args: Number):
+    assert len(args) <= 2, "The number of operands must be at most 3."
+    return vectors.arange(v1.raw, *(v.raw for v in args))
+
+
+@builtin("vector-load")
+def vectorLoad(file: Program):
+    assert isinstance(file, Atom), "Only one file can be provided."
+    file: Path = Path(repr(file))
+    assert file.exists() and file.is_file(), f"File '{file}' not found."
+    return vectors.load(str(file))
+
+
+@builtin("list->vector")
+def listToVector(v: List):
+    return vectors.create(item.raw for item in v.raw)
+
+
+@builtin("vector->list")
+def vectorToList(v: Vector):
+    return List(v.raw.tolist())
+
+
+@builtin("vector-ref")
+def vectorRef(v: Vector, i: int):
+    assert -len(v.raw) <= i < len(v.raw), f"The index {i} is out of range."
+    return vectors.scalar(v.raw[i])
+
+
+@builtin("sum")
+def total(v: Vector):
+    return vectors.total(v)
+
+
+@builtin("mean")
+def mean(v: Vector):
+    return vectors.mean(v)
+
+
+@builtin("dot")
+def dot(v1: Vector, v2: Vector):
+    return vectors.dot(v1, v2)
+
+
 @builtin("print")
 def printFunc(v: Value):
     print(v)
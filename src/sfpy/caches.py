@@ -0,0 +1,116 @@
+from hashlib import sha1
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import Iterator
+
+from .parsers import Parser
+from .programs import Program
+from . import __version__
+
+
+class SourceCache:
+    """
+    On-disk cache of parsed source files, like `.pyc` files for Python sources.
+
+    The top-level forms of a source file are pickled in batches, in `__sfpycache__` next to the source file,
+    or in the cache directory if it is given. A cache file is keyed by the resolved path, modification time and size
+    of the source file and the sfpy version, and is written to a temporary file and renamed,
+    so concurrent interpreters never read a partial cache file.
+    """
+
+    batch = 1024  # forms in each pickled batch, bounding the memory of reading and writing
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, source: Path) -> Path:
+        if self.directory is None:
+            return source.parent / "__sfpycache__" / f"{source.name}.sfpy-{__version__}.pickle"
+        digest = sha1(str(source).encode()).hexdigest()[:16]
+        return self.directory / f"{source.name}.{digest}.sfpy-{__version__}.pickle"
+
+    def key(self, source: Path) -> tuple:
+        stat = source.stat()
+        return (str(source), stat.st_mtime_ns, stat.st_size, __version__)
+
+    def load(self, source: Path) -> Iterator[Program] | None:
+        """Get the cached forms of the source file, or None if there is no valid cache."""
+
+        try:
+            file = self.path(source).open("rb")
+        except OSError:
+            return None
+        try:
+            valid = pickle.load(file) == self.key(source)
+        except Exception:
+            valid = False
+        if not valid:
+            file.close()
+            return None
+
+        def forms():
+            with file:
+                while True:
+                    try:
+                        batch = pickle.load(file)
+                    except EOFError:
+                        break
+                    yield from batch
+
+        return forms()
+
+    def read(self, source: Path, parser: Parser) -> Iterator[Program]:
+        """Read the top-level forms of the source file, from the cache if it is valid, otherwise parse and cache them."""
+
+        source = source.resolve()
+        cached = self.load(source)
+        if cached is not None:
+            self.hits += 1
+            yield from cached
+            return
+
+        self.misses += 1
+        key = self.key(source)
+        target = self.path(source)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(
+                prefix=f".{target.name}.", dir=target.parent)
+            output = os.fdopen(fd, "wb")
+        except OSError:  # not writable, parse without caching
+            output = None
+
+        if output is None:
+            with source.open() as file:
+                yield from parser.stream(file)
+            return
+
+        completed = False
+        try:
+            with output, source.open() as file:
+                pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+                pickler.dump(key)
+                pickler.clear_memo()  # each pickle is loaded on its own
+                batch = []
+                for program in parser.stream(file):
+                    batch.append(program)
+                    if len(batch) >= self.batch:
+                        pickler.dump(batch)
+                        pickler.clear_memo()
+                        batch = []
+                    yield program
+                if batch:
+                    pickler.dump(batch)
+            completed = True
+        finally:
+            try:
+                if completed:
+                    os.replace(temp, target)
+                else:
+                    os.remove(temp)
+            except OSError:
+                pass
@@ -0,0 +1,502 @@
+from contextvars import ContextVar
+from typing import Callable, NamedTuple
+from weakref import WeakKeyDictionary
+
+from .evaluators import CALLSITES, Evaluator, Layout
+from .exceptions import Break
+from .functions import Function, Lambda, Signature
+from .programs import Combination, Literal, Program, Sequence, Symbol
+from .values import EMPTY, String, Value
+
+Compiled = Callable[[Evaluator], Value]
+
+class TailCall(NamedTuple):
+    """A closure to call in place of returning from the calling closure, used for proper tail calls."""
+
+    func: "Closure"
+    args: tuple[Value, ...]
+
+
+BUDGET: ContextVar = ContextVar("budget", default=None)  # budget of the asynchronous evaluation running in this context
+
+ITERATE = object()  # returned by a tail call of a named let, after rebinding the names for the next iteration
+
+
+class Closure(Function):
+    """Function created by a compiled lambda, its body is a prebuilt closure."""
+
+    __slots__ = ("parameters", "body", "eval", "layout", "program")
+
+    def __init__(self, parameters: list[str], body: Compiled, eval: Evaluator, repr: str | None = None, program: Program | None = None,
+                 layout: Layout | None = None) -> None:
+        def raw(*args):
+            return self.apply(tuple(map(Value.ensure, args)))
+
+        super().__init__(raw, Signature(
+            parameters=[(Value, False)] * len(parameters)), repr)
+        self.parameters = parameters
+        self.body = body
+        self.eval = eval
+        self.layout = layout or eval.layout.child(tuple(parameters))
+        self.program = program  # the body before compiling
+
+    def __reduce__(self):
+        assert self.program is not None, "Cannot pickle a closure without its program."
+        # rebuilt from the state, since the environment may refer back to the closure
+        return object.__new__, (type(self),), (self.parameters, self.eval, self.repr, self.program, self.layout, self.eval.compiler)
+
+    def __setstate__(self, state: tuple) -> None:
+        parameters, eval, repr, program, layout, compiler = state
+        scope, cur = set(), layout
+        while cur is not None:
+            scope.update(cur.names)
+            cur = cur.parent
+        compiled = None
+
+        def body(eval: Evaluator) -> Value:  # compiled at the first call, so restoring many closures is cheap
+            nonlocal compiled
+            if compiled is None:
+                compiled = self.body = compiler.compile(program, frozenset(scope), True)
+            return compiled(eval)
+
+        Closure.__init__(self, parameters, body, eval, repr, program, layout)
+
+    def apply(self, args: tuple[Value, ...]) -> Value:
+        """Call with a tuple of arguments, the entry point of compiled call sites, running tail calls in a loop."""
+
+        result = self.run(args)
+        while type(result) is TailCall:
+            result = result.func.run(result.args)
+        return result
+
+    def run(self, args: tuple[Value, ...]) -> "Value | TailCall":
+        """Run the body once, a call in tail position of the body is returned as a `TailCall`."""
+
+        assert len(args) == len(
+            self.parameters), f"The number of operands must be {len(self.parameters)}, but got {len(args)}."
+        budget = BUDGET.get()
+        if budget is not None:
+            budget.step()
+        return self.body(self.eval.frame(self.layout, list(args)))
+
+    def invoke(self, *args, eval: Evaluator) -> Value:
+        return self.apply(args)
+
+    def __call__(self, *args, eval: Evaluator) -> Value:
+        return self.apply(args)
+
+    def bind(self, eval: Evaluator) -> Callable[..., Value]:
+        count, body, frame, layout = len(
+            self.parameters), self.body, self.eval.frame, self.layout
+
+        def call(*args) -> Value:
+            assert len(
+                args) == count, f"The number of operands must be {count}, but got {len(args)}."
+            budget = BUDGET.get()
+            if budget is not None:
+                budget.step()
+            result = body(frame(layout, list(args)))
+            while type(result) is TailCall:
+                result = result.func.run(result.args)
+            return result
+
+        return call
+
+
+def fail(message: str) -> Compiled:
+    """Defer a compile-time error to the time the program is executed, as the tree-walking evaluator does."""
+
+    def raw(eval: Evaluator):
+        raise AssertionError(message)
+
+    return raw
+
+
+class Compiler:
+    """
+    Compile programs into trees of Python closures.
+
+    Node dispatch, literal boxing and the special forms `if`, `define`, `lambda`, `let`, `do` and `while`
+    are decided once at compile time, so executing a compiled program only calls the prebuilt closures.
+    The special forms are treated as syntax unless a lambda parameter shadows them,
+    and they are guarded at run time, so a name rebound by a definition (e.g., `(define do ...)`) is called as a function.
+    Calls of closures in tail position of a lambda body (through `if`, sequences and `let`) are compiled into
+    `TailCall`s, which the calling closure runs in a loop, so tail recursion does not grow the Python stack.
+    """
+
+    def __init__(self) -> None:
+        self.cache: WeakKeyDictionary[Program,
+                                      Compiled] = WeakKeyDictionary()
+        self.forms: dict[str, Callable[[Combination, frozenset[str], bool], Compiled]] = {
+            "if": self.branch,
+            "def": self.define,
+            "define": self.define,
+            "lam": self.lambdafunc,
+            "lambda": self.lambdafunc,
+            "let": self.let,
+            "do": self.doLoop,
+            "while": self.whileLoop,
+        }
+
+    def __call__(self, program: Program) -> Compiled:
+        result = self.cache.get(program)
+        if result is None:
+            result = self.cache[program] = self.compile(program)
+        return result
+
+    def compile(self, program: Program, scope: frozenset[str] = frozenset(), tail: bool = False) -> Compiled:
+        """Compile a program, whose calls in tail position (of a lambda body) return `TailCall`s if `tail` is set."""
+
+        if isinstance(program, Literal):
+            return self.literal(program)
+        elif isinstance(program, Symbol):
+            return self.symbol(program)
+        elif isinstance(program, Combination):
+            return self.combination(program, scope, tail)
+        else:
+            return self.sequence(program, scope, tail)
+
+    def literal(self, program: Literal) -> Compiled:
+        value = program.value
+        return lambda eval: value
+
+    def symbol(self, program: Symbol) -> Compiled:
+        return lambda eval: eval.lookup(program)
+
+    def sequence(self, program: Sequence, scope: frozenset[str], tail: bool = False) -> Compiled:
+        items = [self.compile(item, scope, tail and i == len(program.items) - 1)
+                 for i, item in enumerate(program.items)]
+
+        if not items:
+            return lambda eval: EMPTY
+        if len(items) == 1:
+            return items[0]
+
+        def raw(eval: Evaluator):
+            for item in items:
+                result = item(eval)
+            return result
+
+        return raw
+
+    def operands(self, operands: list[Compiled]) -> Callable[[Evaluator], tuple[Value, ...]]:
+        match operands:
+            case []:
+                return lambda eval: ()
+            case [a]:
+                return lambda eval: (a(eval),)
+            case [a, b]:
+                return lambda eval: (a(eval), b(eval))
+            case [a, b, c]:
+                return lambda eval: (a(eval), b(eval), c(eval))
+            case _:
+                return lambda eval: tuple(o(eval) for o in operands)
+
+    def combination(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        if not program.items:
+            return fail("Cannot evaluate an empty combination.")
+
+        operator = program.operator
+        if isinstance(operator, Symbol) and operator.name in self.forms and operator.name not in scope:
+            form = self.forms[operator.name]
+            compiled = form(program, scope, tail)
+            # `if` checks its binding by itself, as a wrapper would add a Python frame to every recursive call
+            return compiled if form == self.branch else self.guard(program, compiled, scope, tail)
+        return self.call(program, scope, tail)
+
+    def guard(self, program: Combination, form: Compiled, scope: frozenset[str], tail: bool = False) -> Compiled:
+        """Run the compiled special form, or the call in place of it in an evaluator where its name is rebound."""
+
+        name, rebound, other = program.operator.name, CALLSITES.rebound, self.rebinding(program, scope, tail)
+
+        def raw(eval: Evaluator):
+            if name in rebound and (call := other(eval)) is not None:
+                return call(eval)
+            return form(eval)
+
+        return raw
+
+    def rebinding(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Callable[[Evaluator], Compiled | None]:
+        """Get the call to run in place of a special form in an evaluator where its name is bound to another function, or None."""
+
+        from .builtins import builtins
+
+        builtin, compiled = builtins[program.operator.name], None
+
+        def raw(eval: Evaluator) -> Compiled | None:
+            nonlocal compiled
+            if eval.callee(program)[0] is builtin:
+                return None
+            if compiled is None:  # compiled at the first rebound call, since the operands are already compiled by the form
+                compiled = self.call(program, scope, tail)
+            return compiled
+
+        return raw
+
+    def call(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        operator = program.operator
+        nodes = program.operands
+        operands = self.operands(
+            [self.compile(node, scope) for node in nodes])
+
+        if isinstance(operator, Symbol) and tail:
+            def raw(eval: Evaluator):
+                func, lazy = eval.callee(program)
+                if type(func) is Closure:
+                    return TailCall(func, operands(eval))
+                if lazy:
+                    return func(*nodes, eval=eval)
+                return func(*operands(eval), eval=eval)
+
+            return raw
+
+        if isinstance(operator, Symbol):  # resolved through the inline cache of the call site
+            def raw(eval: Evaluator):
+                func, lazy = eval.callee(program)
+                if type(func) is Closure:
+                    return func.apply(operands(eval))
+                if lazy:
+                    return func(*nodes, eval=eval)
+                return func(*operands(eval), eval=eval)
+
+            return raw
+
+        operator = self.compile(operator, scope)
+
+        def raw(eval: Evaluator):
+            func = operator(eval)
+            if type(func) is Closure:
+                return TailCall(func, operands(eval)) if tail else func.apply(operands(eval))
+            assert isinstance(
+                func, Function), f"Operator must be a function: {func}{program.location()}"
+            if func.signature.lazy:
+                return func(*nodes, eval=eval)
+            return func(*operands(eval), eval=eval)
+
+        return raw
+
+    def branch(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        if len(program.operands) != 3:
+            return self.guard(program, fail(f"The number of operands must be 3, but got {len(program.operands)}."), scope, tail)
+
+        predicate = self.compile(program.operands[0], scope)
+        exprTrue, exprFalse = (self.compile(node, scope, tail) for node in program.operands[1:])
+        rebound, other = CALLSITES.rebound, self.rebinding(program, scope, tail)
+
+        def raw(eval: Evaluator):
+            if "if" in rebound and (call := other(eval)) is not None:
+                return call(eval)
+            return exprTrue(eval) if predicate(eval) else exprFalse(eval)
+
+        return raw
+
+    def define(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        if len(program.operands) != 2:
+            return fail(f"The number of operands must be 2, but got {len(program.operands)}.")
+
+        name, value = program.operands
+        if not isinstance(name, Symbol):
+            return fail("The symbol name must be a single string.")
+        if not String(name.name).isSymbol():
+            return fail("The symbol name is not valid.")
+
+        name = name.name
+        value = self.compile(value, scope)
+
+        def raw(eval: Evaluator):
+            result = value(eval)
+            eval.symbol(name, result)
+            return result
+
+        return raw
+
+    def lambdafunc(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        from .builtins import getParameterList
+
+        if len(program.operands) != 2:
+            return fail(f"The number of operands must be 2, but got {len(program.operands)}.")
+
+        parameters, body = program.operands
+        try:
+            parameters = getParameterList(parameters)
+        except AssertionError as ex:
+            return fail(str(ex))
+
+        repr = f"( lambda ( {' '.join(parameters)} ) {body!r} )"
+        program, body = body, self.compile(body, scope | set(parameters), True)
+
+        def raw(eval: Evaluator):
+            return Closure(parameters, body, eval, repr, program)
+
+        return raw
+
+    def let(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        from .builtins import getBindings, getBody, runNative
+
+        operands = program.operands
+        name = operands[0].name if operands and isinstance(operands[0], Symbol) else None
+        try:
+            if name is None:
+                assert operands, "The number of operands must be at least 1, but got 0."
+                bindings, body = getBindings(operands[0]), getBody(operands[1:])
+            else:
+                assert len(operands) >= 3, "The named let must have bindings and a body."
+                bindings, body = getBindings(operands[1]), getBody(operands[2:])
+        except AssertionError as ex:
+            return fail(str(ex))
+
+        names = tuple(name for name, _, _ in bindings)
+        inits = self.operands([self.compile(init, scope) for _, init, _ in bindings])
+
+        if name is None:
+            compiled = self.compile(body, scope | set(names), tail)
+
+            def raw(eval: Evaluator):
+                return compiled(eval.frame(eval.layout.child(names), list(inits(eval))))
+
+            return raw
+
+        inner = scope | set(names) | {name}
+        repr = f"( lambda ( {' '.join(names)} ) {body!r} )"
+        compiled, iteration = self.compile(body, inner, True), self.iteration(body, inner, name)
+
+        def raw(eval: Evaluator):
+            outer = eval.frame(eval.layout.child((name,)), [EMPTY])
+            loop = outer.slots[0] = Closure(list(names), compiled, outer, repr, body)
+            frame = outer.frame(loop.layout, list(inits(eval)))
+            iterations, budget = 0, BUDGET.get()
+            try:
+                while (result := iteration(frame)) is ITERATE:
+                    iterations += 1
+                    if budget is not None:
+                        budget.step()
+                    elif iterations == Lambda.threshold and eval.translatable:
+                        result = runNative(Lambda(list(names), body, outer, loop.layout), name, frame, body)
+                        if result is not None:
+                            return result
+            except Break as ex:
+                return ex.value
+            return result
+
+        return raw
+
+    def iteration(self, program: Program, scope: frozenset[str], name: str) -> Compiled:
+        """Compile the body of a named let, whose tail calls of the loop rebind the names and return `ITERATE`."""
+
+        if isinstance(program, Sequence) and program.items:
+            items = [self.compile(item, scope) for item in program.items[:-1]]
+            last = self.iteration(program.items[-1], scope, name)
+
+            def raw(eval: Evaluator):
+                for item in items:
+                    item(eval)
+                return last(eval)
+
+            return raw
+
+        if not isinstance(program, Combination) or not program.items or not isinstance(program.operator, Symbol):
+            return self.compile(program, scope)
+
+        operator, nodes = program.operator, program.operands
+        if operator.name == "if" and "if" not in scope and len(nodes) == 3:
+            predicate = self.compile(nodes[0], scope)
+            exprTrue, exprFalse = (self.iteration(node, scope, name) for node in nodes[1:])
+
+            def raw(eval: Evaluator):
+                return exprTrue(eval) if predicate(eval) else exprFalse(eval)
+
+            return self.guard(program, raw, scope)
+
+        if operator.name != name:
+            return self.compile(program, scope)
+
+        count, call = len(nodes), self.combination(program, scope)
+        operands = self.operands([self.compile(node, scope) for node in nodes])
+
+        def raw(eval: Evaluator):
+            if eval.lookup(operator) is not eval.parent.slots[0]:  # the name is rebound
+                return call(eval)
+            args = operands(eval)
+            assert len(
+                args) == count, f"The number of operands must be {count}, but got {len(args)}."
+            eval.slots = list(args)
+            return ITERATE
+
+        return raw
+
+    def doLoop(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        from .builtins import doLambda, getBindings, runNative
+
+        operands = program.operands
+        try:
+            assert len(operands) >= 2, f"The number of operands must be at least 2, but got {len(operands)}."
+            bindings, exit = getBindings(operands[0], steps=True), operands[1]
+            assert isinstance(exit, Combination) and exit.items, f"Exit clause {exit} is invalid."
+        except AssertionError as ex:
+            return fail(str(ex))
+
+        names = tuple(name for name, _, _ in bindings)
+        inner = scope | set(names)
+        inits = self.operands([self.compile(init, scope) for _, init, _ in bindings])
+        indices = [i for i, (_, _, step) in enumerate(bindings) if step is not None]
+        steps = self.operands([self.compile(step, inner) for _, _, step in bindings if step is not None])
+        test, results = self.compile(exit.items[0], inner), self.sequence(Sequence(exit.items[1:]), inner)
+        body = [self.compile(item, inner) for item in operands[2:]]
+        translatable = not body and len(exit.items) == 2
+
+        def raw(eval: Evaluator):
+            frame = eval.frame(eval.layout.child(names), list(inits(eval)))
+            slots, iterations, budget = frame.slots, 0, BUDGET.get()
+            try:
+                while not test(frame):
+                    for item in body:
+                        item(frame)
+                    for i, value in zip(indices, steps(frame)):  # every step sees the values of this iteration
+                        slots[i] = value
+                    iterations += 1
+                    if budget is not None:
+                        budget.step()
+                    elif iterations == Lambda.threshold and translatable and eval.translatable:
+                        result = runNative(doLambda(bindings, exit.items[0], exit.items[1], eval, frame.layout), " do", frame, exit)
+                        if result is not None:
+                            return result
+            except Break as ex:
+                return ex.value
+            return results(frame)
+
+        return raw
+
+    def whileLoop(self, program: Combination, scope: frozenset[str], tail: bool = False) -> Compiled:
+        if not program.operands:
+            return fail("The number of operands must be at least 1, but got 0.")
+
+        test, *body = (self.compile(node, scope) for node in program.operands)
+
+        def raw(eval: Evaluator):
+            result, budget = EMPTY, BUDGET.get()
+            try:
+                while test(eval):
+                    if budget is not None:
+                        budget.step()
+                    for item in body:
+                        result = item(eval)
+            except Break as ex:
+                return ex.value
+            return result
+
+        return raw
+
+
+class CompiledEvaluator(Evaluator):
+    """Evaluator which executes programs by the closure-compilation engine."""
+
+    __slots__ = ("compiler",)
+
+    def __init__(self, parent: "CompiledEvaluator | None" = None, interpreter=None,
+                 layout: Layout | None = None, slots: list[Value] | None = None, compiler: Compiler | None = None) -> None:
+        super().__init__(parent, interpreter, layout, slots)
+        self.compiler = compiler or (
+            parent.compiler if parent is not None else Compiler())
+
+    def evaluate(self, program: Program) -> Value:
+        return self.compiler(program)(self)
@@ -0,0 +1,160 @@
+import asyncio
+import inspect
+import sys
+from time import monotonic
+
+from .builtins import builtins
+from .compilers import BUDGET, Closure
+from .evaluators import Evaluator
+from .exceptions import FuelExhausted, MemoryExhausted
+from .functions import Function, Lambda, MemoLambda, Tail
+from .programs import Combination, Literal, Program, Symbol
+from .values import EMPTY, String, Value
+
+
+class Budget:
+    """
+    Limits of an asynchronous evaluation: evaluation steps (fuel), wall-clock seconds, and net allocated memory blocks.
+
+    Steps are counted in slices, the limits are checked at the end of each slice, where the evaluation yields
+    to the event loop. Memory is measured only while the evaluation runs, so other tasks' allocations are not counted.
+    """
+
+    def __init__(self, fuel: int | None = None, timeout: float | None = None, memory: int | None = None, slice: int = 1000) -> None:
+        assert slice > 0, "The slice must be positive."
+        self.fuel = fuel
+        self.deadline = monotonic() + timeout if timeout is not None else None
+        self.memory = memory
+        self.slice = slice
+        self.steps = 0
+        self.end = slice  # the step ending the current slice
+        self.blocks = 0
+        self.start = sys.getallocatedblocks()
+
+    def step(self) -> bool:
+        """Count a step, return True at the end of a slice, after checking the limits."""
+
+        self.steps += 1
+        if self.fuel is not None and self.steps > self.fuel:
+            raise FuelExhausted(self.fuel)
+        if self.steps < self.end:
+            return False
+        self.end += self.slice
+        self.check()
+        return True
+
+    def check(self) -> None:
+        self.pause()
+        self.resume()
+        if self.memory is not None and self.blocks > self.memory:
+            raise MemoryExhausted(self.blocks)
+        if self.deadline is not None and monotonic() > self.deadline:
+            raise TimeoutError("Evaluation timed out.")
+
+    def pause(self) -> None:
+        self.blocks += sys.getallocatedblocks() - self.start
+
+    def resume(self) -> None:
+        self.start = sys.getallocatedblocks()
+
+    def remaining(self) -> float | None:
+        return max(0.0, self.deadline - monotonic()) if self.deadline is not None else None
+
+
+class AsyncEvaluator(Evaluator):
+    """
+    Tree-walking evaluator which counts steps against a budget, and yields to the event loop between slices of steps.
+
+    `evaluateAsync` steps through the special forms `if` and `define`, and lambda calls (including tail calls),
+    so many evaluations interleave fairly in one event loop. A call to a Python function returning an awaitable
+    suspends only this evaluation until the awaitable is done. Builtins calling back into Scheme (e.g., `map` or `while`)
+    and compiled closures run to completion without yielding, but their steps are still counted, so a budget stops them as well:
+    frames of lambdas called here (even ones defined in the global environment) are created as evaluators of this budget,
+    and compiled closures and loops charge the budget of the running context (`BUDGET`). Native translations of lambdas,
+    which could not be counted, are not used here.
+    """
+
+    __slots__ = ("budget",)
+
+    translatable = False
+
+    def __init__(self, parent: Evaluator | None = None, interpreter=None, layout=None, slots: list[Value] | None = None,
+                 budget: Budget | None = None) -> None:
+        super().__init__(parent, interpreter, layout, slots)
+        self.budget = budget or (parent.budget if isinstance(
+            parent, AsyncEvaluator) else Budget())
+
+    def evaluate(self, program: Program) -> Value:
+        self.budget.step()  # nested synchronous evaluation cannot yield, but it is limited
+        return super().evaluate(program)
+
+    def enter(self, parent: Evaluator, layout, slots: list[Value]) -> Evaluator:
+        return AsyncEvaluator(parent, parent.interpreter, layout, slots, self.budget)
+
+    async def evaluateAsync(self, program: Program) -> Value:
+        token = BUDGET.set(self.budget)  # the context is copied for each task, so concurrent evaluations do not mix
+        try:
+            return await self.run(program, self)
+        finally:
+            BUDGET.reset(token)
+
+    async def run(self, program: Program, eval: Evaluator) -> Value:
+        budget = self.budget
+        branch, define = builtins["if"], builtins["define"]
+
+        while True:  # trampoline as `Evaluator.evaluate`, tail calls continue the loop
+            if budget.step():
+                budget.pause()
+                await asyncio.sleep(0)
+                budget.resume()
+
+            if isinstance(program, Literal):
+                return program.value
+            if isinstance(program, Symbol):
+                return eval.lookup(program)
+            if not isinstance(program, Combination):
+                items = program.items
+                if not items:
+                    return EMPTY
+                for item in items[:-1]:
+                    await self.run(item, eval)
+                program = items[-1]
+                continue
+
+            assert program.items, "Cannot evaluate an empty combination."
+            operator = await self.run(program.operator, eval)
+            assert isinstance(
+                operator, Function), f"Operator must be a function: {operator}{program.location()}"
+            operands = program.operands
+
+            if operator is branch and len(operands) == 3:
+                program = operands[1] if await self.run(operands[0], eval) else operands[2]
+                continue
+            if operator is define and len(operands) == 2 and isinstance(operands[0], Symbol):
+                name = String(operands[0].name)
+                assert name.isSymbol(), "The symbol name is not valid."
+                return eval.symbol(name, await self.run(operands[1], eval))
+
+            if operator.signature.lazy:  # other syntax, e.g., lambda and macros
+                result = operator.invoke(*operands, eval=eval)
+            else:
+                args = [await self.run(o, eval) for o in operands]
+                if isinstance(operator, Lambda) and not isinstance(operator, MemoLambda):
+                    # step into the body, skipping any native translation
+                    program, eval = operator.body, eval.enter(
+                        operator.eval, operator.layout, operator.signature.adapt(*args))
+                    continue
+                if isinstance(operator, Closure):  # compiled by the closure engine, run as one step
+                    result = operator.apply(tuple(args))
+                else:
+                    result = operator.invoke(*args, eval=eval)
+
+            if type(result) is Tail:
+                program, eval = result
+                continue
+            if inspect.isawaitable(result.raw):
+                budget.pause()
+                raw = await asyncio.wait_for(result.raw, budget.remaining())
+                budget.resume()
+                return Value.ensure(raw)
+            return result
@@ -1,120 +1,263 @@
-import builtins
-from functools import wraps
-import importlib
-from typing import TYPE_CHECKING, Callable
-from .functions import Function, function
-from .programs import Program
-from .tokens import TRUE as TOKEN_TRUE, FALSE as TOKEN_FALSE, LEFT, RIGHT
-from .values import Complex, Float, Int, String, Value, EMPTY, TRUE as VALUE_TRUE, FALSE as VALUE_FALSE
+from typing import TYPE_CHECKING
+from .functions import Function, Tail, function
+from .interops import ATTRIBUTES
+from .programs import Combination, Literal, Program, Sequence, Symbol
+from .values import String, Value, EMPTY
 
 if TYPE_CHECKING:
     from .interpreters import Interpreter
 
 
-def resolvePythonAttribute(name: str):
-    if ":" not in name:
-        return None
+class CallSites:
+    """
+    Statistics of the inline caches at call sites, and the version which guards them.
 
-    module, name = name.split(':', 1)
-    try:
-        module = importlib.import_module(module) if module else builtins
-        names = name.split(".")
-        cur = module
-        for n in names:
-            if n:
-                cur = getattr(cur, n)
-        result = cur
-    except:
-        result = None
+    A call site caches the function its operator symbol resolved to, for the layout it was evaluated in.
+    The version is bumped by every definition which may change what a cached symbol resolves to,
+    i.e., a definition at the root adding a name or replacing a function, and the first definition of a name in the frames of a layout.
+    The names of builtins ever rebound by a definition are kept as well, so compiled special forms know when to check their binding.
+    """
 
-    if isinstance(result, Callable):
-        @wraps(result)
-        def wrapper(*args):
-            return result(*[arg.raw if isinstance(arg, Value) else arg for arg in args])
+    def __init__(self) -> None:
+        self.version = 0
+        self.rebound: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
 
-        return Value.ensure(wrapper)
+    def invalidate(self) -> None:
+        self.version += 1
+        self.invalidations += 1
 
-    return Value.ensure(result) if result is not None else None
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+CALLSITES = CallSites()
+
+
+class Layout:
+    """
+    Parameter names of each frame in an evaluator chain.
+
+    Layouts are interned by their parent and names, so frames of the same lexical shape share one layout,
+    and a symbol resolved to a (depth, slot) address for a layout stays valid for every frame of that layout.
+    Child environments of a run (e.g., `Evaluator.sub`) get a fresh layout instead,
+    so names defined dynamically in one request are not marked for the later ones.
+    """
+
+    __slots__ = ("names", "parent", "children", "defined")
+
+    def __init__(self, names: tuple[str, ...] = (), parent: "Layout | None" = None) -> None:
+        self.names = names
+        self.parent = parent
+        self.children: dict[tuple[str, ...], Layout] = {}
+        self.defined: set[str] = set()  # names defined dynamically in some frame of this layout
+
+    def child(self, names: tuple[str, ...]) -> "Layout":
+        result = self.children.get(names)
+        if result is None:
+            result = self.children[names] = Layout(names, self)
+        return result
+
+    def __reduce__(self):
+        # unpickled into the interned layout, unless it is a fresh one
+        if self.parent is None:
+            return (Layout, (self.names,))
+        if self.parent.children.get(self.names) is not self:
+            return (Layout, (self.names, self.parent), self.defined)
+        return (Layout.child, (self.parent, self.names), self.defined)
+
+    def __setstate__(self, defined: set[str]) -> None:
+        if defined - self.defined:
+            self.defined |= defined
+            CALLSITES.invalidate()
+
+    def shadows(self, name: str) -> bool:
+        """Whether a name may be defined dynamically in a frame of this layout or an outer one, hiding the root."""
+
+        layout = self
+        while layout is not None:
+            if name in layout.defined:
+                return True
+            layout = layout.parent
+        return False
+
+    def address(self, name: str) -> tuple["Layout", int, int | None]:
+        """Return (layout, depth, slot) of a name, the slot is None for names resolved at the root."""
+
+        depth, layout = 0, self
+        while layout.parent is not None:
+            if name in layout.names:
+                return self, depth, layout.names.index(name)
+            depth += 1
+            layout = layout.parent
+        return self, depth, None
+
+    def resolve(self, program: Program) -> None:
+        """Resolve the symbols in a program evaluated in frames of this layout, including nested lambda bodies."""
+
+        if program.resolved is self:
+            return
+        program.resolved = self
+
+        if isinstance(program, Symbol):
+            program.address = self.address(program.token)
+        elif isinstance(program, Combination | Sequence):
+            items = program.items
+            if isinstance(program, Combination) and len(items) == 3 and isinstance(items[0], Symbol) and items[0].token in {"lambda", "lam"} \
+                    and isinstance(items[1], Combination) and all(isinstance(p, Symbol) for p in items[1].items):
+                self.resolve(items[0])
+                self.child(tuple(p.name for p in items[1].items)).resolve(
+                    items[2])
+            else:
+                for item in items:
+                    self.resolve(item)
 
 
 class Evaluator:
-    def __init__(self, parent: "Evaluator | None" = None, interpreter: "Interpreter | None" = None) -> None:
+    __slots__ = ("parent", "interpreter", "symbols", "layout", "slots", "version")
+
+    translatable = True  # whether lambdas defined in this environment may be translated into native functions
+
+    def __init__(self, parent: "Evaluator | None" = None, interpreter: "Interpreter | None" = None,
+                 layout: Layout | None = None, slots: list[Value] | None = None) -> None:
         self.parent = parent
         self.interpreter = interpreter
         self.symbols: dict[str, Value] = {}
+        self.layout = layout or Layout((), parent.layout if parent is not None else None)
+        self.slots = slots if slots is not None else []
+        self.version = 0  # bumped on every definition at the root
 
         if self.parent is None:
             from .builtins import builtins
             self.symbols.update(builtins)
 
+    def __reduce__(self):
+        # rebuilt from the state, since the values in the environment may refer back to it
+        slots = [name for cls in type(self).__mro__ for name in cls.__dict__.get("__slots__", ())]
+        return object.__new__, (type(self),), (None, {name: getattr(self, name) for name in slots})
+
     def sub(self, symbols: dict[str, Value] | None = None) -> "Evaluator":
-        sub = Evaluator(self, self.interpreter)
+        sub = type(self)(self, self.interpreter)
         if symbols:
-            sub.symbols.update(symbols)
+            for name, value in symbols.items():
+                sub.symbol(name, value)
         return sub
 
+    def frame(self, layout: Layout, slots: list[Value]) -> "Evaluator":
+        """Create a sub-evaluator whose parameters, named by the layout, are stored in slots."""
+
+        return type(self)(self, self.interpreter, layout, slots)
+
+    def enter(self, parent: "Evaluator", layout: Layout, slots: list[Value]) -> "Evaluator":
+        """Create the frame of a lambda called by this evaluator, as a sub-evaluator of the lambda's environment."""
+
+        return parent.frame(layout, slots)
+
+    def variables(self) -> dict[str, Value]:
+        return dict(zip(self.layout.names, self.slots)) | self.symbols
+
     def evaluate(self, program: Program) -> Value:
-        if not program:
-            return EMPTY
-        if program.combination():
-            return self.combination(program)
-        elif program.atomic():
-            return self.atomic(program)
-        else:
-            return self.sequence(program)
-
-    def symbol(self, symbol: str | String, value=None) -> Value:
-        symbol = str(symbol)
-        if value == None:
-            if self.parent == None:
-                if symbol not in self.symbols:  # try resolve python function
-                    pyAttr = resolvePythonAttribute(symbol)
-                    if pyAttr is not None:
-                        return pyAttr
-
-                assert symbol in self.symbols, f"Undefined symbol: '{symbol}'"
-            elif symbol not in self.symbols:
-                return self.parent.symbol(symbol)
-            return self.symbols[symbol]
+        eval = self
+        while True:  # trampoline, tail calls continue the loop instead of nesting
+            if isinstance(program, Literal):
+                return program.value
+            elif isinstance(program, Symbol):
+                return eval.lookup(program)
+            elif isinstance(program, Combination):
+                result = eval.combination(program)
+                if type(result) is not Tail:
+                    return result
+                program, eval = result
+            elif program.items:
+                items = program.items
+                for i in range(len(items) - 1):
+                    eval.evaluate(items[i])
+                program = items[-1]
+            else:
+                return EMPTY
+
+    def symbol(self, symbol: str | String, value: Value | None = None) -> Value:
+        if isinstance(symbol, String):
+            symbol = symbol.raw
+
+        if value is None:
+            eval = self
+            while eval.parent is not None:
+                names = eval.layout.names
+                if symbol in names:
+                    return eval.slots[names.index(symbol)]
+                if symbol in eval.symbols:
+                    return eval.symbols[symbol]
+                eval = eval.parent
+            return eval.rootSymbol(symbol)
         else:
-            self.symbols[symbol] = value
+            names = self.layout.names
+            if symbol in names:
+                self.slots[names.index(symbol)] = value
+            else:
+                from .builtins import builtins
+                old = self.symbols.get(symbol)
+                self.symbols[symbol] = value
+                if symbol in builtins and value is not builtins[symbol]:
+                    CALLSITES.rebound.add(symbol)
+                if self.parent is None:
+                    self.version += 1
+                    if old is None or isinstance(old, Function):  # call sites only cache functions
+                        CALLSITES.invalidate()
+                elif symbol not in self.layout.defined:
+                    self.layout.defined.add(symbol)
+                    CALLSITES.invalidate()
             return value
 
-    def atomic(self, program: Program) -> Value:
-        assert len(
-            program) == 1, f"Cannot directly evaluate a non-single program: {program}"
+    def rootSymbol(self, symbol: str, program: Program | None = None) -> Value:
+        result = self.symbols.get(symbol)
+        if result is None:  # try resolve python function
+            result = ATTRIBUTES.resolve(symbol)
+            assert result is not None, f"Undefined symbol: '{symbol}'{program.location() if program is not None else ''}"
+        return result
+
+    def lookup(self, program: Symbol) -> Value:
+        """Get the value of a symbol by its lexical address, resolved once for each layout."""
 
-        token = program[0]
-        assert token not in {LEFT, RIGHT}, "Cannot evaluate a parenthese."
+        address = program.address
+        if address is None or address[0] is not self.layout:
+            address = program.address = self.layout.address(program.token)
+        _, depth, slot = address
 
-        if token == TOKEN_TRUE:
-            return VALUE_TRUE
-        if token == TOKEN_FALSE:
-            return VALUE_FALSE
+        eval = self
+        for _ in range(depth):
+            if eval.symbols and program.token in eval.symbols:  # defined dynamically, hiding outer frames
+                return eval.symbols[program.token]
+            eval = eval.parent
 
-        for parse, target in [(int, Int), (float, Float), (complex, Complex)]:
-            try:
-                if token == "j":  # ignore single 'j' complex, use 0+j
-                    continue
-                val = parse(token)
-                return target(val)
-            except:
-                pass
+        return eval.slots[slot] if slot is not None else eval.rootSymbol(program.token, program)
 
-        return self.symbol(token)
+    def callee(self, program: Combination) -> tuple[Function, bool]:
+        """Evaluate the operator of a call, return the function and whether it is lazy, cached at the call site if possible."""
 
-    def combination(self, program: Program) -> Value:
-        subprograms = program.split()
-        operator, operands = subprograms[0], subprograms[1:]
+        cache = program.cache
+        if cache is not None and cache[0] is self.layout and cache[1] == CALLSITES.version:
+            CALLSITES.hits += 1
+            return cache[2], cache[3]
 
-        operator = self.evaluate(operator)
+        assert program.items, "Cannot evaluate an empty combination."
+        version = CALLSITES.version
+        operator = self.evaluate(program.operator)
         assert isinstance(
-            operator, Function), f"Operator must be a function: {operator}"
+            operator, Function), f"Operator must be a function: {operator}{program.location()}"
+        lazy = operator.signature.lazy
 
-        return operator(*[o if operator.signature.lazy else self.evaluate(o) for o in operands], eval=self)
+        CALLSITES.misses += 1
+        symbol = program.operator
+        # only symbols resolved at the root are the same in every frame of the layout
+        if isinstance(symbol, Symbol) and symbol.address[2] is None and not self.layout.shadows(symbol.token):
+            program.cache = (self.layout, version, operator, lazy)
+        return operator, lazy
 
-    def sequence(self, program: Program) -> Value:
-        result = EMPTY
-        for sub in program.split():
-            result = self.evaluate(sub)
-        return result
+    def combination(self, program: Combination) -> Value | Tail:
+        operator, lazy = self.callee(program)
+        if lazy:
+            return operator.invoke(*program.operands, eval=self)
+        return operator.invoke(*[self.evaluate(o) for o in program.operands], eval=self)
@@ -1,3 +1,28 @@
 class InvalidInput(Exception):
-    def __init__(self, input: str) -> None:
-        super().__init__(f"Invalid input: '{input}'")
+    def __init__(self, input: str, line: int | None = None, column: int | None = None) -> None:
+        position = f" at line {line}, column {column}" if line is not None else ""
+        super().__init__(f"Invalid input{position}: '{input}'")
+        self.line = line
+        self.column = column
+
+
+class Break(Exception):
+    """Exit the innermost running loop (`while`, `do` or named `let`) with a value."""
+
+    def __init__(self, value) -> None:
+        super().__init__("Break outside of a loop.")
+        self.value = value
+
+
+class BudgetExceeded(Exception):
+    """An evaluation ran out of its budget, and was stopped between two steps."""
+
+
+class FuelExhausted(BudgetExceeded):
+    def __init__(self, fuel: int) -> None:
+        super().__init__(f"Fuel exhausted after {fuel} steps.")
+
+
+class MemoryExhausted(BudgetExceeded):
+    def __init__(self, blocks: int) -> None:
+        super().__init__(f"Memory exhausted after allocating {blocks} blocks.")
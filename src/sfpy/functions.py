@@ -1,62 +1,105 @@
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from functools import wraps
-from typing import Callable, Type, TYPE_CHECKING
+from types import UnionType
+from typing import Callable, NamedTuple, Type, TYPE_CHECKING, get_args
 from inspect import signature, Parameter
-
-from .tokens import LEFT
+from time import monotonic
 
 from .programs import Program
-from .values import Bool, Int, Object, String, Value, allValues
+from .values import FALSE, INT_MAX, INT_MIN, INTS, TRUE, Float, Int, Object, Value, allValues
 
 if TYPE_CHECKING:
-    from .evaluators import Evaluator
+    from .evaluators import Evaluator, Layout
 
 
 EVAL_PARAMETER = "eval"
 
 
+def typeName(kind: Type[Value] | tuple[Type[Value], ...]) -> str:
+    return " | ".join(k.__qualname__ for k in kind) if isinstance(kind, tuple) else kind.__qualname__
+
+
 @dataclass
 class Signature:
-    parameters: list[tuple[Type[Value], bool]] | None = None
-    variadic: tuple[Type[Value], bool] | None = None
+    # a parameter type is a value class, or a tuple of value classes for union annotations
+    parameters: list[tuple[Type[Value] | tuple[Type[Value], ...], bool]] | None = None
+    variadic: tuple[Type[Value] | tuple[Type[Value], ...], bool] | None = None
     lazy: bool = False
     eval: bool = False
 
-    def adapt(self, *args: Value) -> list:
-        if self.parameters is None:
-            return [v.raw if isinstance(v, Object) else v for v in args]
-
-        parameters = self.parameters
+    # `adapt(*args) -> list` is an instance attribute, the adapter specialized for the current fields.
+    # It is built at the first call after any field changes, so each call only runs the checks it needs.
 
-        if self.lazy:
-            parameters = [(Program, False) for _ in parameters]
-
-        variadic = []
-
-        if self.variadic is not None:
-            assert len(args) >= len(
-                parameters), f"Missing arguments, expected {len(parameters)}, but got {len(args)}."
+    def __setattr__(self, name: str, value) -> None:
+        super().__setattr__(name, value)
+        super().__setattr__("adapt", self.prepare)
 
-            target, flat = self.variadic
-            for arg in args[len(parameters):]:
-                assert isinstance(
-                    arg, target), f"The variadic {i}-th argument must of type {target}, but got {type(arg)}."
-                variadic.append(
-                    arg.raw if flat else arg)
-
-            args = args[:len(parameters)]
-        else:
-            assert len(args) == len(
-                parameters), f"The number of operands must be {len(parameters)}, but got {len(args)}."
+    def prepare(self, *args) -> list:
+        adapt = self.build()
+        super().__setattr__("adapt", adapt)
+        return adapt(*args)
 
-        result = []
-        for i, (parameter, arg) in enumerate(zip(parameters, args)):
-            target, flat = parameter
-            assert isinstance(
-                arg, target), f"The {i}-th argument must of type {target}, but got {type(arg)}."
-            result.append(arg.raw if flat else arg)
-
-        return result + variadic
+    def build(self) -> Callable[..., list]:
+        if self.parameters is None:
+            return lambda *args: [v.raw if isinstance(v, Object) else v for v in args]
+
+        parameters = [(Program, False) for _ in self.parameters] if self.lazy else self.parameters
+        count = len(parameters)
+        checks = tuple((i, target) for i, (target, _) in enumerate(
+            parameters) if target is not Value)
+        flats = tuple(i for i, (_, flat) in enumerate(parameters) if flat)
+
+        def mismatch(i: int, target, arg, kind: str = "") -> AssertionError:
+            return AssertionError(f"The {kind}{i}-th argument must be of type {typeName(target)}, but got {typeName(type(arg))}.")
+
+        if self.variadic is None:
+            def arity(args) -> AssertionError:
+                return AssertionError(f"The number of operands must be {count}, but got {len(args)}.")
+
+            if not checks and not flats:
+                def adapt(*args) -> list:
+                    if len(args) != count:
+                        raise arity(args)
+                    return list(args)
+            else:
+                def adapt(*args) -> list:
+                    if len(args) != count:
+                        raise arity(args)
+                    for i, target in checks:
+                        if not isinstance(args[i], target):
+                            raise mismatch(i, target, args[i])
+                    result = list(args)
+                    for i in flats:
+                        result[i] = result[i].raw
+                    return result
+
+            return adapt
+
+        variadic, flat = self.variadic
+
+        def missing(args) -> AssertionError:
+            return AssertionError(f"Missing arguments, expected {count}, but got {len(args)}.")
+
+        def adapt(*args) -> list:
+            if len(args) < count:
+                raise missing(args)
+            for i, target in checks:
+                if not isinstance(args[i], target):
+                    raise mismatch(i, target, args[i])
+            if variadic is not Value:
+                for i in range(count, len(args)):
+                    if not isinstance(args[i], variadic):
+                        raise mismatch(i - count, variadic, args[i], "variadic ")
+            result = list(args)
+            for i in flats:
+                result[i] = result[i].raw
+            if flat:
+                for i in range(count, len(result)):
+                    result[i] = result[i].raw
+            return result
+
+        return adapt
 
     def __repr__(self) -> str:
         result = ""
@@ -64,9 +107,9 @@ class Signature:
         if self.parameters is None:
             result += "any"
         else:
-            items = [t[0].__qualname__ if t else "?" for t in self.parameters]
+            items = [typeName(t[0]) if t else "?" for t in self.parameters]
             if self.variadic:
-                items.append(f"{self.variadic[0].__qualname__}...")
+                items.append(f"{typeName(self.variadic[0])}...")
             result += ", ".join(items)
 
         if self.lazy:
@@ -75,23 +118,196 @@ class Signature:
         return result
 
 
+class Tail(NamedTuple):
+    """A program to evaluate in place of returning from a call, used for proper tail calls."""
+
+    program: Program
+    eval: "Evaluator"
+
+
 class Function(Value):
+    __slots__ = ("signature", "repr", "tail", "pure")
     __rawType__ = Callable
 
-    def __init__(self, raw, signature: Signature | None = None, repr: str | None = None) -> None:
+    def __init__(self, raw, signature: Signature | None = None, repr: str | None = None, tail: bool = False, pure: bool = False) -> None:
         super().__init__(raw)
-        self.signature = signature or inferSignature(raw)
+        if signature is not None:
+            self.signature = signature
         self.repr = repr
+        self.tail = tail
+        self.pure = pure
+
+    def __getattr__(self, name: str):
+        # the signature is inferred at the first use, so defining builtins does not inspect each one at startup
+        if name == "signature":
+            self.signature = inferSignature(self.raw)
+            return self.signature
+        raise AttributeError(name)
+
+    def invoke(self, *args, eval: "Evaluator") -> "Value | Tail":
+        """Call the function, a tail function may return a Tail for the caller to continue with."""
+
+        signature = self.signature
+        if signature.eval:
+            result = self.raw(*signature.adapt(*args), eval=eval)
+        else:
+            result = self.raw(*signature.adapt(*args))
+        return result if self.tail and type(result) is Tail else Value.ensure(result)
 
     def __call__(self, *args, eval: "Evaluator"):
-        return Value.ensure(
-            self.raw(*self.signature.adapt(*args),
-                     **({EVAL_PARAMETER: eval} if self.signature.lazy and self.signature.eval else {})))
+        result = self.invoke(*args, eval=eval)
+        return result.eval.evaluate(result.program) if type(result) is Tail else result
+
+    def bind(self, eval: "Evaluator") -> Callable[..., Value]:
+        """Get a Python callable calling the function in the environment, used by builtins calling it per item."""
+
+        return lambda *args: self(*args, eval=eval)
 
     def __repr__(self) -> str:
         return self.repr if self.repr is not None else f"(lambda ({repr(self.signature)}) (...))"
 
 
+class Numeric(Function):
+    """
+    Arithmetic or comparing builtin with a fast path for two int or float arguments.
+
+    The fast path applies the operator to the raw numbers without adapting the arguments by the signature,
+    and boxes the result into the bool singletons, the small integers or a new number. Other arguments
+    (e.g., vectors, complex numbers or more than two numbers), and failing operators, take the generic path.
+    """
+
+    __slots__ = ("operator",)
+
+    generic = Function.invoke  # not replaced by the profiler, which wraps `invoke` of both classes
+
+    def __init__(self, raw, operator: Callable) -> None:
+        super().__init__(raw)
+        self.operator = operator
+
+    def invoke(self, *args, eval: "Evaluator") -> Value:
+        if len(args) == 2:
+            a, b = args
+            if (type(a) is Int or type(a) is Float) and (type(b) is Int or type(b) is Float):
+                try:
+                    result = self.operator(a.raw, b.raw)
+                except ArithmeticError:  # reported by the generic path, e.g., dividing by zero
+                    return self.generic(*args, eval=eval)
+                kind = type(result)
+                if kind is bool:
+                    return TRUE if result else FALSE
+                if kind is int:
+                    return INTS[result - INT_MIN] if INT_MIN <= result < INT_MAX else Int(result)
+                if kind is float:
+                    return Float(result)
+                return Value.ensure(result)
+        return self.generic(*args, eval=eval)
+
+
+class Lambda(Function):
+    """
+    Function defined by a lambda expression, its body is evaluated in a sub-evaluator of the definition environment.
+
+    After `threshold` calls, a lambda is offered to the translator, and if its body can be translated,
+    later calls run the native Python function (which returns None to fall back to evaluating the body).
+    """
+
+    __slots__ = ("parameters", "body", "eval", "layout", "calls", "native")
+
+    threshold: int | None = 1000
+
+    def __init__(self, parameters: list[str], body: Program, eval: "Evaluator", layout: "Layout | None" = None) -> None:
+        super().__init__(lambda *args: self(*map(Value.ensure, args), eval=eval), Signature(parameters=[(Value, False)] * len(parameters)),
+                         f"( lambda ( {' '.join(parameters)} ) {body!r} )", tail=True)
+        self.parameters = parameters
+        self.body = body
+        self.eval = eval
+        self.layout = layout or eval.layout.child(tuple(parameters))
+        self.layout.resolve(body)
+        self.calls = 0
+        self.native: Callable[..., Value | None] | None = None
+
+    def __reduce__(self):
+        # rebuilt from the state, since the environment may refer back to the lambda
+        return object.__new__, (type(self),), (self.parameters, self.body, self.eval, self.layout)
+
+    def __setstate__(self, state: tuple) -> None:
+        Lambda.__init__(self, *state)
+
+    def invoke(self, *args, eval: "Evaluator") -> "Value | Tail":
+        if self.native is not None and eval.translatable:
+            result = self.native(*args)
+            if result is not None:
+                return result
+        else:
+            self.calls += 1
+            if self.calls == self.threshold and self.eval.translatable:
+                from .translators import TRANSLATOR
+                self.native = TRANSLATOR.translate(self)
+        return Tail(self.body, eval.enter(self.eval, self.layout, self.signature.adapt(*args)))
+
+
+class MemoLambda(Lambda):
+    """
+    Lambda whose results are cached by its arguments, keeping at most `maxsize` recently used results for `ttl` seconds.
+
+    Calls with unhashable arguments are not cached. Memo lambdas are never translated into native functions,
+    since a native self call would skip the cache.
+    """
+
+    __slots__ = ("maxsize", "ttl", "results", "hits", "misses")
+
+    threshold = None
+
+    def __init__(self, parameters: list[str], body: Program, eval: "Evaluator", maxsize: int = 1024, ttl: float | None = None, layout: "Layout | None" = None) -> None:
+        super().__init__(parameters, body, eval, layout)
+        assert maxsize > 0, "The maximum size must be positive."
+        assert ttl is None or ttl > 0, "The time to live must be positive."
+        self.repr = f"( memo-lambda ( {' '.join(parameters)} ) {body!r} )"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.results: OrderedDict[tuple[Value, ...],
+                                  tuple[Value, float | None]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def invoke(self, *args, eval: "Evaluator") -> Value:
+        results = self.results
+        try:
+            cached = results.get(args)
+        except TypeError:  # unhashable arguments
+            return eval.enter(self.eval, self.layout, self.signature.adapt(*args)).evaluate(self.body)
+
+        if cached is not None:
+            value, expire = cached
+            if expire is None or monotonic() < expire:
+                self.hits += 1
+                results.move_to_end(args)
+                return value
+            del results[args]
+
+        self.misses += 1
+        value = eval.enter(self.eval, self.layout, self.signature.adapt(*args)).evaluate(self.body)
+        results[args] = (value, monotonic() +
+                         self.ttl if self.ttl is not None else None)
+        if len(results) > self.maxsize:
+            results.popitem(last=False)
+        return value
+
+    def __reduce__(self):
+        # cached results are dropped, their expiring times are only meaningful in this process
+        return object.__new__, (type(self),), (self.parameters, self.body, self.eval, self.maxsize, self.ttl, self.layout)
+
+    def __setstate__(self, state: tuple) -> None:
+        MemoLambda.__init__(self, *state)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.results), "maxsize": self.maxsize}
+
+    def clear(self) -> None:
+        self.results.clear()
+        self.hits = self.misses = 0
+
+
 def inferSignature(func: Callable) -> Signature:
     try:
         sign = signature(func)
@@ -111,6 +327,9 @@ def inferSignature(func: Callable) -> Signature:
     def infer(p: Parameter):
         assert result.lazy or p.annotation != Program, f"Parameter named '{p.name}' cannot be Program in a non-lazy function, use Program for all parameters."
 
+        if isinstance(p.annotation, UnionType) and all(issubclass(item, Value) for item in get_args(p.annotation)):
+            return (get_args(p.annotation), False)
+
         for item in allValues():
             if p.annotation in {item, item.__rawType__}:
                 return (item, p.annotation == item.__rawType__)
@@ -132,3 +351,27 @@ def inferSignature(func: Callable) -> Signature:
 
 def function(func: Callable):
     return Function(func)
+
+
+def tail(func: Callable) -> Function:
+    """Mark a function to return a Tail, so the evaluator continues with the returned program without nesting."""
+
+    result = func if isinstance(func, Function) else function(func)
+    result.tail = True
+    return result
+
+
+def numeric(operator: Callable[[int | float, int | float], object]) -> Callable[[Callable], Numeric]:
+    """Define an arithmetic or comparing builtin, whose calls on two int or float arguments apply the operator directly."""
+
+    def decorator(func: Callable) -> Numeric:
+        return Numeric(func, operator)
+    return decorator
+
+
+def pure(func: Callable) -> Function:
+    """Mark a function to depend only on its arguments without side effects, so the optimizer may call it ahead of time."""
+
+    result = func if isinstance(func, Function) else function(func)
+    result.pure = True
+    return result
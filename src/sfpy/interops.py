@@ -0,0 +1,111 @@
+import builtins
+from collections import OrderedDict
+from functools import wraps
+import importlib
+from threading import RLock
+from typing import Callable, Iterable
+
+from .values import Value
+
+
+def resolvePythonAttribute(name: str):
+    if ":" not in name:
+        return None
+
+    module, name = name.split(':', 1)
+    try:
+        module = importlib.import_module(module) if module else builtins
+        names = name.split(".")
+        cur = module
+        for n in names:
+            if n:
+                cur = getattr(cur, n)
+        result = cur
+    except:
+        result = None
+
+    if isinstance(result, Callable):
+        @wraps(result)
+        def wrapper(*args):
+            return result(*[arg.raw if isinstance(arg, Value) else arg for arg in args])
+
+        return Value.ensure(wrapper)
+
+    return Value.ensure(result) if result is not None else None
+
+
+class AttributeCache:
+    """
+    Resolved Python attributes keyed by qualified name (`module:attribute`).
+
+    Misses are cached as None too, so an unresolvable name is only imported once until it is invalidated.
+    With a maximum size, the least recently used names are evicted first.
+    """
+
+    def __init__(self, maxsize: int | None = None) -> None:
+        self.items: OrderedDict[str, Value | None] = OrderedDict()
+        self.lock = RLock()
+        self._maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int | None:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int | None) -> None:
+        assert value is None or value > 0, "The maximum size must be positive."
+        with self.lock:
+            self._maxsize = value
+            self.trim()
+
+    def trim(self) -> None:
+        if self._maxsize is not None:
+            while len(self.items) > self._maxsize:
+                self.items.popitem(last=False)
+
+    def resolve(self, name: str) -> Value | None:
+        try:
+            result = self.items[name]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            if self._maxsize is not None:
+                with self.lock:
+                    if name in self.items:
+                        self.items.move_to_end(name)
+            return result
+
+        if ":" not in name:  # not a qualified name, no need to remember
+            return None
+
+        result = resolvePythonAttribute(name)
+        with self.lock:
+            self.misses += 1
+            self.items[name] = result
+            self.trim()
+        return result
+
+    def preload(self, names: Iterable[str]) -> dict[str, Value | None]:
+        """Resolve the names ahead of time, return the resolved values (None for unresolvable names)."""
+
+        return {name: self.resolve(name) for name in names}
+
+    def invalidate(self, name: str | None = None) -> None:
+        """Forget one name, or every name if no name is given, e.g., after reloading a module."""
+
+        from .evaluators import CALLSITES
+        with self.lock:
+            if name is None:
+                self.items.clear()
+            else:
+                self.items.pop(name, None)
+        CALLSITES.invalidate()  # call sites may have cached the attributes
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+ATTRIBUTES = AttributeCache()
@@ -1,19 +1,126 @@
-from .exceptions import InvalidInput
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, TextIO
+
+from .programs import Program, Sequence
 from .values import EMPTY, Value
 from . import __version__
 
+if TYPE_CHECKING:
+    from .caches import SourceCache
+    from .profilers import Profiler
+
+
+ENGINES = ["tree", "closure"]
+
 
 class Interpreter:
-    def __init__(self) -> None:
+    def __init__(self, engine: str = "tree", expandMacros: bool = False, cache: "SourceCache | None" = None, optimize: bool = False) -> None:
         from .parsers import Parser
-        from .evaluators import Evaluator
+        assert engine in ENGINES, f"Unknown engine: '{engine}'"
         self.parser = Parser()
-        self.evaluator = Evaluator(interpreter=self)
+        self.engine = engine
+        self.cache = cache
+        if expandMacros:
+            from .macros import MacroExpander
+            self.expander = MacroExpander()
+        else:
+            self.expander = None
+        if optimize:
+            from .optimizers import Optimizer
+            self.optimizer = Optimizer()
+        else:
+            self.optimizer = None
+        if engine == "closure":
+            from .compilers import CompiledEvaluator
+            self.evaluator = CompiledEvaluator(interpreter=self)
+        else:
+            from .evaluators import Evaluator
+            self.evaluator = Evaluator(interpreter=self)
+
+    def preload(self, names: Iterable[str]) -> dict[str, Value | None]:
+        """Resolve Python interoperation names (e.g., `math:sqrt`) into the shared attribute cache ahead of time."""
+
+        from .interops import ATTRIBUTES
+        return ATTRIBUTES.preload(names)
+
+    def profile(self) -> "Profiler":
+        """Create a profiler, which profiles the evaluation while it is enabled, e.g., `with interpreter.profile() as profiler:`."""
+
+        from .profilers import Profiler
+        return Profiler()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Counters of the evaluation caches: inline caches at call sites, Python attributes, tiered compilation, and the optimizer if enabled."""
+
+        from .evaluators import CALLSITES
+        from .interops import ATTRIBUTES
+        from .translators import TRANSLATOR
+        result = {"callsites": CALLSITES.stats(),
+                  "attributes": {"hits": ATTRIBUTES.hits, "misses": ATTRIBUTES.misses, "size": len(ATTRIBUTES)},
+                  "tiers": TRANSLATOR.stats()}
+        if self.optimizer is not None:
+            result["optimizer"] = {"folded": self.optimizer.folded,
+                                   "pruned": self.optimizer.pruned, "inlined": self.optimizer.inlined}
+        return result
+
+    def load(self, text: str) -> Program:
+        """Parse the source text, and apply the enabled program passes."""
+
+        return self.transform(self.parser.nocheck(text))
+
+    def transform(self, program: Program) -> Program:
+        """Apply the enabled program passes, macro expansion and then optimization."""
+
+        if self.expander is not None:
+            program = self.expander.expand(program, self.evaluator)
+        if self.optimizer is not None:
+            program = self.optimizer.optimize(program, self.evaluator)
+        return program
+
+    def read(self, file: TextIO | Path) -> Iterator[Program]:
+        if not isinstance(file, Path):
+            yield from self.parser.stream(file)
+        elif self.cache is not None:
+            yield from self.cache.read(file, self.parser)
+        else:
+            with file.open() as f:
+                yield from self.parser.stream(f)
+
+    def forms(self, file: TextIO | Path) -> Iterator[Program]:
+        """Read the top-level forms of a source file (or stdin) one by one, and apply the enabled program passes."""
+
+        for program in self.read(file):
+            yield self.transform(program)
+
+    def stream(self, file: TextIO | Path) -> Value:
+        """Evaluate a source file form by form, so each form is evaluated and freed before the next one is read."""
+
+        result = EMPTY
+        for program in self.forms(file):
+            result = self.evaluator.evaluate(program)
+        assert isinstance(
+            result, Value), f"Unexpected evaluated value: {result}"
+        return result
 
     def interprete(self, text: str) -> Value:
-        program = self.parser.parse(text)
-        assert program is not None, InvalidInput(text)
-        result = self.evaluator.evaluate(program)
+        result = self.evaluator.evaluate(self.load(text))
+        assert isinstance(
+            result, Value), f"Unexpected evaluated value: {result}"
+        return result
+
+    async def interpreteAsync(self, text: str, fuel: int | None = None, timeout: float | None = None, memory: int | None = None, slice: int = 1000) -> Value:
+        """
+        Evaluate the source text in a new child of the global environment, yielding to the event loop every `slice` steps.
+
+        The evaluation raises FuelExhausted after `fuel` steps, TimeoutError after `timeout` seconds,
+        and MemoryExhausted after `memory` net allocated memory blocks.
+        """
+
+        from .coroutines import AsyncEvaluator, Budget
+        program = self.load(text)
+        eval = AsyncEvaluator(self.evaluator, self,
+                              budget=Budget(fuel, timeout, memory, slice))
+        result = await eval.evaluateAsync(program)
         assert isinstance(
             result, Value), f"Unexpected evaluated value: {result}"
         return result
@@ -22,26 +129,27 @@ class Interpreter:
         print(f"scheme-from-python (sfpy) {__version__}")
         while True:
             try:
-                text = input("> ")
-                while True:
-                    program = self.parser.nocheck(text)
-                    if program.valid():
-                        break
-
-                    right = program.missingRight()
-                    line = input(". " + "  " * (right or 0))
+                # each line is read once by the incremental parser, until the forms are complete
+                reader = self.parser.reader()
+                forms = reader.feed(input("> ") + "\n")
+                while not reader.complete:
+                    line = input(". " + "  " * reader.depth)
 
                     if not line:
                         # auto fix right parentheses
-                        text += ")" * (right or 0)
+                        forms += reader.feed(")" * reader.depth)
+                        forms += reader.close()
                         break
 
-                    text += f" {line}"
+                    forms += reader.feed(line + "\n")
 
-                result = self.interprete(text)
+                result = self.evaluator.evaluate(self.transform(Sequence(forms)))
                 self.evaluator.symbol("_", result)
                 if result != EMPTY:
                     print(result)
+            except EOFError:  # end of the input
+                print()
+                break
             except Exception as ex:
                 import traceback
                 traceback.print_exception(ex)
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from .functions import Function, Signature, Tail
+from .programs import Combination, Program, Sequence, Symbol
+
+if TYPE_CHECKING:
+    from .evaluators import Evaluator
+
+
+DEFINES = {"define", "def"}
+LAMBDAS = {"lambda", "lam"}
+MEMOS = {"memo-lambda"}
+LOOPS = {"let", "do"}
+MACROS = {"macro", "mac"}
+
+
+class Macro(Function):
+    """
+    Function defined by a macro expression, its expansion is evaluated in the calling environment.
+
+    Macros do not capture the creation environment, so an expansion only depends on the argument syntax,
+    and is memoized for each call site (the tuple of argument nodes), keeping at most `maxsize` recent expansions.
+    """
+
+    __slots__ = ("parameters", "body", "expansions")
+
+    maxsize = 256
+
+    def __init__(self, parameters: list[str], body: Program) -> None:
+        super().__init__(lambda *args, eval: Tail(self.expand(tuple(args)), eval),
+                         Signature(parameters=[(Program, False)] * len(parameters), lazy=True, eval=True),
+                         f"( macro ( {' '.join(parameters)} ) {body!r} )", tail=True)
+        self.parameters = parameters
+        self.body = body
+        self.expansions: OrderedDict[tuple[Program, ...],
+                                     Program] = OrderedDict()
+
+    def __reduce__(self):
+        return Macro, (self.parameters, self.body)
+
+    def expand(self, args: tuple[Program, ...]) -> Program:
+        expansions = self.expansions
+        result = expansions.get(args)
+        if result is None:
+            result = expansions[args] = self.body.substitute(
+                dict(zip(self.parameters, args)))
+            if len(expansions) > self.maxsize:
+                expansions.popitem(last=False)
+        else:
+            expansions.move_to_end(args)
+        return result
+
+
+def parseMacro(program: Program) -> tuple[str, Macro] | None:
+    """Get the name and macro of a `(define name (macro (p1 ... pn) body))` form."""
+
+    from .builtins import getParameterList
+
+    if not (isinstance(program, Combination) and len(program.items) == 3 and isinstance(program.operator, Symbol)
+            and program.operator.name in DEFINES and isinstance(program.items[1], Symbol)):
+        return None
+    value = program.items[2]
+    if not (isinstance(value, Combination) and len(value.items) == 3 and isinstance(value.operator, Symbol)
+            and value.operator.name in MACROS):
+        return None
+    try:
+        parameters = getParameterList(value.items[1])
+    except AssertionError:
+        return None
+    return program.items[1].name, Macro(parameters, value.items[2])
+
+
+def definedNames(program: Program, top: bool = True) -> set[str]:
+    """Collect names defined by `define` forms which are not at the top level."""
+
+    result = set()
+    if isinstance(program, Combination | Sequence):
+        items = program.items
+        if not top and isinstance(program, Combination) and len(items) == 3 and isinstance(items[0], Symbol) \
+                and items[0].name in DEFINES and isinstance(items[1], Symbol):
+            result.add(items[1].name)
+        for item in items:
+            result |= definedNames(item,
+                                   top and isinstance(program, Sequence))
+    return result
+
+
+class MacroExpander:
+    """
+    Ahead-of-time macro expansion over a whole program.
+
+    Top-level forms are scanned in order, uses of macros defined by earlier top-level `(define name (macro ...))` forms,
+    or already bound to macros in the evaluator, are replaced by their expansions.
+    Names that are rebound inside the program (other than by a top-level define, which ends the macro's scope),
+    hidden by the parameters of lambdas (or memo lambdas) or the names bound by `let` and `do`, or used recursively inside their own expansion are left for the evaluator.
+    """
+
+    def expand(self, program: Program, eval: "Evaluator | None" = None) -> Program:
+        macros: dict[str, Macro] = {name: value for name, value in eval.symbols.items() if isinstance(
+            value, Macro)} if eval is not None else {}
+        dynamic = definedNames(program)
+
+        result = []
+        for item in program.items if isinstance(program, Sequence) else [program]:
+            definition = parseMacro(item)
+            if definition is not None:
+                name, macro = definition
+                if name not in dynamic:
+                    macros[name] = macro
+                result.append(item)
+                continue
+
+            result.append(self.walk(item, macros, dynamic, frozenset(), frozenset()))
+
+            if isinstance(item, Combination) and len(item.items) == 3 and isinstance(item.operator, Symbol) \
+                    and item.operator.name in DEFINES and isinstance(item.items[1], Symbol):
+                macros.pop(item.items[1].name, None)
+
+        return Sequence(result) if isinstance(program, Sequence) else result[0]
+
+    def walk(self, program: Program, macros: dict[str, Macro], dynamic: set[str], scope: frozenset[str], active: frozenset[str]) -> Program:
+        if isinstance(program, Sequence):
+            return Sequence([self.walk(item, macros, dynamic, scope, active) for item in program.items])
+        if not isinstance(program, Combination) or not program.items:
+            return program
+
+        operator, operands = program.operator, program.operands
+        if isinstance(operator, Symbol) and operator.name not in scope and operator.name not in dynamic:
+            name = operator.name
+            macro = macros.get(name)
+            if macro is not None:
+                if len(operands) == len(macro.parameters) and name not in active:
+                    return self.walk(macro.expand(tuple(operands)), macros, dynamic, scope, active | {name})
+                return Combination([operator, *(self.walk(item, macros, dynamic, scope, active) for item in operands)])
+            if name in MACROS:
+                return program
+            if name in LAMBDAS | MEMOS and len(operands) >= 2 and isinstance(operands[0], Combination) \
+                    and all(isinstance(p, Symbol) for p in operands[0].items):
+                inner = scope | {p.name for p in operands[0].items}
+                return Combination([operator, operands[0], self.walk(operands[1], macros, dynamic, inner, active),
+                                    *(self.walk(item, macros, dynamic, scope, active) for item in operands[2:])])
+            if name in LOOPS:
+                return self.loop(program, macros, dynamic, scope, active)
+            if name == "define-memo" and len(operands) >= 3 and isinstance(operands[1], Combination) \
+                    and all(isinstance(p, Symbol) for p in operands[1].items):
+                inner = scope | {p.name for p in operands[1].items}
+                return Combination([operator, operands[0], operands[1], self.walk(operands[2], macros, dynamic, inner, active),
+                                    *(self.walk(item, macros, dynamic, scope, active) for item in operands[3:])])
+
+        return Combination([self.walk(item, macros, dynamic, scope, active) for item in program.items])
+
+    def loop(self, program: Combination, macros: dict[str, Macro], dynamic: set[str], scope: frozenset[str], active: frozenset[str]) -> Program:
+        """Walk a `let` (plain or named) or `do` form, the bound names hide macros in its body; a malformed form is left as it is."""
+
+        from .builtins import getBindings
+
+        operator, operands = program.operator, program.operands
+        named = operator.name == "let" and len(operands) >= 1 and isinstance(operands[0], Symbol)
+        head = operands[:2] if named else operands[:1]
+        if not head or len(operands) <= len(head):  # a body, or the exit clause of `do`, is required
+            return program
+        try:
+            bindings = getBindings(head[-1], steps=operator.name == "do")
+        except AssertionError:
+            return program
+
+        inner = scope | {name for name, _, _ in bindings} | ({operands[0].name} if named else set())
+        walked = Combination([Combination([item.items[0], self.walk(init, macros, dynamic, scope, active),
+                                           *([self.walk(step, macros, dynamic, inner, active)] if step is not None else [])])
+                              for item, (_, init, step) in zip(head[-1].items, bindings)])
+        body = [self.walk(item, macros, dynamic, inner, active) for item in operands[len(head):]]
+        return Combination([operator, *head[:-1], walked, *body])
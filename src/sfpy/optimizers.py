@@ -0,0 +1,167 @@
+from typing import TYPE_CHECKING
+
+from .functions import Function
+from .macros import DEFINES, LAMBDAS, MACROS
+from .programs import Combination, Literal, Program, Sequence, Symbol
+from .tokens import Token
+from .values import Bool, Number
+
+if TYPE_CHECKING:
+    from .evaluators import Evaluator
+
+
+BRANCHES = {"if"}
+FOLDED = (Number, Bool)  # results of folded calls, the values which literals are parsed into
+
+
+def definedNames(program: Program) -> set[str]:
+    """Collect the names defined anywhere in a program."""
+
+    result = set()
+    if isinstance(program, Combination | Sequence):
+        items = program.items
+        if isinstance(program, Combination) and len(items) >= 2 and isinstance(items[0], Symbol) \
+                and items[0].name in DEFINES | {"define-memo"} and isinstance(items[1], Symbol):
+            result.add(items[1].name)
+        for item in items:
+            result |= definedNames(item)
+    return result
+
+
+def symbolNames(program: Program) -> set[str]:
+    if isinstance(program, Symbol):
+        return {program.name}
+    result = set()
+    if isinstance(program, Combination | Sequence):
+        for item in program.items:
+            result |= symbolNames(item)
+    return result
+
+
+def size(program: Program) -> int:
+    return 1 + sum(size(item) for item in program.items) if isinstance(program, Combination | Sequence) else 1
+
+
+def lambdaParameters(program: Program) -> list[str] | None:
+    """Get the parameter names of a well-formed `(lambda (p1 ... pn) body)` form."""
+
+    if isinstance(program, Combination) and len(program.items) == 3 and isinstance(program.operator, Symbol) \
+            and program.operator.name in LAMBDAS and isinstance(program.items[1], Combination) \
+            and all(isinstance(p, Symbol) for p in program.items[1].items):
+        return [p.name for p in program.items[1].items]
+    return None
+
+
+class Optimizer:
+    """
+    Ahead-of-time constant folding and partial evaluation over a whole program.
+
+    Calls to pure builtins whose operands are all literals are replaced by their results, `if` forms with a literal
+    predicate by the taken branch, and small lambdas applied directly to literals or symbols by their bodies
+    with the parameters substituted. A name is only treated as a builtin while it is bound to the builtin
+    in the global environment, not defined anywhere in the program, and not hidden by lambda parameters,
+    so rebinding a name with `define` disables folding it. Lambda bodies are left as they are, since they are evaluated
+    later, when the name may be rebound by another program. Failing calls (e.g., dividing by zero) are left
+    for the evaluator, so they only fail if they are evaluated.
+    """
+
+    inlineSize = 32  # maximum nodes in the body of an inlined lambda
+
+    def __init__(self) -> None:
+        self.folded = 0
+        self.pruned = 0
+        self.inlined = 0
+
+    def optimize(self, program: Program, eval: "Evaluator | None" = None) -> Program:
+        from .builtins import builtins
+        symbols = eval.symbols if eval is not None else builtins
+        dynamic = definedNames(program)
+
+        def builtin(program: Program, scope: frozenset[str]) -> Function | None:
+            """Get the builtin function a symbol refers to, or None if it may refer to anything else."""
+
+            if not isinstance(program, Symbol):
+                return None
+            name = program.name
+            value = builtins.get(name)
+            if value is None or name in scope or name in dynamic or symbols.get(name) is not value:
+                return None
+            return value
+
+        def walk(program: Program, scope: frozenset[str]) -> Program:
+            if isinstance(program, Sequence):
+                return Sequence([walk(item, scope) for item in program.items])
+            if not isinstance(program, Combination) or not program.items:
+                return program
+
+            operator, operands = program.operator, program.operands
+            func = builtin(operator, scope)
+            if func is not None and func.signature.lazy:
+                name = operator.name
+                if name in DEFINES and len(operands) == 2:
+                    return Combination([operator, operands[0], walk(operands[1], scope)])
+                if name in BRANCHES and len(operands) == 3:
+                    predicate, exprTrue, exprFalse = (walk(item, scope) for item in operands)
+                    if isinstance(predicate, Literal):
+                        self.pruned += 1
+                        return exprTrue if predicate.value else exprFalse
+                    return Combination([operator, predicate, exprTrue, exprFalse])
+                return program  # other syntax, e.g., macros, is left as it is
+
+            items = [walk(item, scope) for item in program.items]
+            operator, operands = items[0], items[1:]
+
+            if func is not None and func.pure and all(isinstance(item, Literal) for item in operands):
+                try:
+                    result = func(*(item.value for item in operands), eval=eval)
+                except Exception:  # left to fail when it is evaluated
+                    result = None
+                if isinstance(result, FOLDED):
+                    self.folded += 1
+                    return Literal(Token(repr(result)), result)
+
+            inlined = self.inline(operator, operands, scope, builtin)
+            if inlined is not None:
+                self.inlined += 1
+                return walk(inlined, scope)
+
+            return Combination(items)
+
+        return walk(program, frozenset())
+
+    def inline(self, operator: Program, operands: list[Program], scope: frozenset[str], builtin) -> Program | None:
+        """Substitute the arguments into the body of a lambda applied directly, if it is small and the result is equivalent."""
+
+        parameters = lambdaParameters(operator)
+        if parameters is None or builtin(operator.operator, scope) is None or len(parameters) != len(operands) \
+                or not all(isinstance(item, Literal | Symbol) for item in operands):
+            return None
+        body = operator.items[2]
+        if size(body) > self.inlineSize:
+            return None
+
+        # the substitution does not respect binding, so no lambda in the body may rebind a parameter or an argument
+        names = set(parameters) | {item.name for item in operands if isinstance(item, Symbol)}
+
+        def safe(program: Program) -> bool:
+            if not isinstance(program, Combination | Sequence):
+                return True
+            if isinstance(program, Combination) and program.items and isinstance(program.operator, Symbol):
+                name = program.operator.name
+                inner = lambdaParameters(program)
+                if inner is not None:
+                    return not names & set(inner) and safe(program.items[2])
+                # definitions would move into the caller's environment, and other syntax is not substituted into
+                if name in DEFINES | MACROS | LAMBDAS:
+                    return False
+                func = builtin(program.operator, scope)
+                if func is not None and func.signature.lazy and name not in BRANCHES:
+                    return False
+            return all(safe(item) for item in program.items)
+
+        # an unused symbol argument would no longer be evaluated, hiding an undefined symbol
+        used = symbolNames(body)
+        if any(isinstance(item, Symbol) and parameter not in used for parameter, item in zip(parameters, operands)) \
+                or not safe(body):
+            return None
+        return body.substitute(dict(zip(parameters, operands)))
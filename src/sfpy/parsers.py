@@ -1,11 +1,207 @@
-from .programs import Program
-from .tokens import Token
+import re
+from typing import Iterable, Iterator, TextIO
+
+from .exceptions import InvalidInput
+from .programs import Atom, Combination, Literal, Program, Sequence, Symbol
+from .tokens import Token, LEFT, RIGHT, TRUE as TOKEN_TRUE, FALSE as TOKEN_FALSE
+from .values import String, Value, TRUE as VALUE_TRUE, FALSE as VALUE_FALSE
+
+
+# a number or boolean must be followed by a delimiter, otherwise it is the prefix of a symbol, e.g., `1+`
+DELIMITED = r"(?![^\s()\";])"
+
+# each match is a token after optional spaces, so spaces are skipped without matches of their own,
+# the alternatives are ordered by how common they are, and atoms not classified are left to `Parser.atom`
+LEXER = re.compile(rf"""
+    [^\S\n]*
+    (?:
+        (?P<left>\()
+      | (?P<right>\))
+      | (?P<symbol>[^\s()";\d+\-.\#][^\s()";]*)
+      | (?P<newline>\n)
+      | (?P<int>[+-]?\d+{DELIMITED})
+      | (?P<float>[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?{DELIMITED})
+      | (?P<bool>\#[tf]{DELIMITED})
+      | (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<quote>")
+      | (?P<comment>;[^\n]*)
+      | (?P<atom>[^\s()";]+)
+    )
+""", re.VERBOSE | re.DOTALL)
+
+# symbols which may be Python numbers in notations the lexer does not classify, e.g., 1_000, 1+2j and inf
+NUMERIC = re.compile(r"[+-]*(?:.*\d|j$|(?:inf|infinity|nan)j?$)", re.IGNORECASE | re.DOTALL)
+PARTIAL = {"symbol", "int", "float", "bool", "comment", "atom"}  # kinds which may continue after the end of the text
+
+ESCAPES = re.compile(r"\\(.)", re.DOTALL)
+ESCAPED = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+Lexeme = tuple[Token, str, int, int]  # token, kind, line and column
+PARENS = {"left": LEFT, "right": RIGHT}
+
+
+class Reader:
+    """
+    Incremental parser state, fed with source text piece by piece, e.g., lines of the interactor or chunks of a file.
+
+    Each piece is lexed once, so feeding a long form line by line costs linear time in its length.
+    A token, comment or string which may continue in the next piece is kept until it is complete.
+    """
+
+    def __init__(self, parser: "Parser") -> None:
+        self.parser = parser
+        self.stack: list[list[Program]] = [[]]
+        self.lefts: list[Lexeme] = []  # unclosed left parentheses
+        self.rest = ""  # text not lexed yet
+        self.line = 1  # position of the rest
+        self.column = 1
+
+    @property
+    def depth(self) -> int:
+        """Count of unclosed left parentheses."""
+
+        return len(self.lefts)
+
+    @property
+    def complete(self) -> bool:
+        """Whether every form fed so far is complete."""
+
+        return not self.lefts and not self.rest.strip()
+
+    def feed(self, text: str, final: bool = False) -> list[Program]:
+        """Read a piece of source text, return the top-level forms completed by it."""
+
+        return self.push(self.lex(self.rest + text, final))
+
+    def close(self) -> list[Program]:
+        """Read the rest of the source text, which must complete every form."""
+
+        forms = self.feed("", final=True)
+        if self.lefts:
+            _, _, line, column = self.lefts[0]
+            raise InvalidInput(LEFT, line, column)
+        return forms
+
+    def lex(self, text: str, final: bool = False) -> Iterator[Lexeme]:
+        """
+        Split the text into classified tokens with their positions, comments are dropped.
+
+        Unless it is final, the text is lexed up to a token or comment which may continue after the end,
+        or a string which is not terminated yet, which is kept as the rest for the next piece.
+        """
+
+        line, start = self.line, 1 - self.column  # start is the index of the current line's start
+        size = len(text)
+        for match in LEXER.finditer(text):
+            kind = match.lastgroup
+            if kind == "newline":
+                line += 1
+                start = match.end()
+                continue
+            index = match.start(kind)
+            if not final and (kind == "quote" or kind in PARTIAL and match.end() == size):
+                self.rest, self.line, self.column = text[index:], line, index - start + 1
+                return
+            if kind == "comment":
+                continue
+            if kind == "quote":
+                raise InvalidInput('"', line, index - start + 1)
+
+            value = match[kind]
+            # lexemes are consumed as they are lexed, so they are freed without piling up for the garbage collector
+            yield PARENS.get(kind) or Token(value), kind, line, index - start + 1
+            if kind == "string" and "\n" in value:
+                line += value.count("\n")
+                start = index + value.rindex("\n") + 1
+        self.rest, self.line, self.column = "", line, size - start + 1
+
+    def push(self, lexemes: Iterable[Lexeme]) -> list[Program]:
+        st, lefts, atom = self.stack, self.lefts, self.parser.atom
+        forms = []
+        for lexeme in lexemes:
+            token, kind, line, column = lexeme
+            if kind == "left":
+                st.append([])
+                lefts.append(lexeme)
+                continue
+            if kind == "right":
+                if not lefts:
+                    raise InvalidInput(token, line, column)
+                _, _, line, column = lefts.pop()
+                node = Combination(st.pop())
+            else:
+                node = atom(token, kind)
+            node.line, node.column = line, column
+            st[-1].append(node)
+            if not lefts:
+                forms.append(st[0].pop())
+        return forms
 
 
 class Parser:
-    def nocheck(self, text: str) -> Program:
-        return Program(map(Token, text.replace("(", " ( ").replace(")", " ) ").split()))
+    def tokenize(self, text: str) -> list[Token]:
+        return [lexeme[0] for lexeme in self.reader().lex(text, final=True)]
+
+    def missingRight(self, tokens: list[Token]) -> int | None:
+        cnt = 0
+        for token in tokens:
+            if token == LEFT:
+                cnt += 1
+            elif token == RIGHT:
+                if cnt <= 0:
+                    return None
+                cnt -= 1
+        return cnt
+
+    def atom(self, token: Token, kind: str | None = None) -> Atom:
+        match kind:
+            case "symbol" | "atom" if not NUMERIC.match(token):
+                return Symbol(token)
+            case "int":
+                return Literal(token, Value.ensure(int(token)))
+            case "float":
+                return Literal(token, Value.ensure(float(token)))
+            case "string":
+                return Literal(token, String(ESCAPES.sub(lambda m: ESCAPED.get(m[1], m[1]), token[1:-1])))
+
+        # tokens not lexed, and atoms in other notations of Python numbers
+        if token == TOKEN_TRUE:
+            return Literal(token, VALUE_TRUE)
+        if token == TOKEN_FALSE:
+            return Literal(token, VALUE_FALSE)
+
+        for parse in [int, float, complex]:
+            try:
+                if token == "j":  # ignore single 'j' complex, use 0+j
+                    continue
+                return Literal(token, Value.ensure(parse(token)))  # small integers are shared
+            except:
+                pass
+
+        return Symbol(token)
+
+    def reader(self) -> Reader:
+        return Reader(self)
+
+    def nocheck(self, text: str) -> Sequence:
+        reader = self.reader()
+        return Sequence(reader.feed(text) + reader.close())
 
     def parse(self, text: str) -> Program | None:
-        result = self.nocheck(text)
-        return result if result.valid() else None
+        """Parse the text, return None if it misses right parentheses."""
+
+        reader = self.reader()
+        forms = reader.feed(text, final=True)
+        return Sequence(forms) if not reader.lefts else None
+
+    def stream(self, file: TextIO, size: int = 1 << 16) -> Iterator[Program]:
+        """Read top-level forms chunk by chunk, each form is yielded as soon as its chunk is read."""
+
+        reader = self.reader()
+        while True:
+            chunk = file.read(size)
+            if not chunk:
+                break
+            yield from reader.feed(chunk)
+        yield from reader.close()
@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import pickle
+from typing import TYPE_CHECKING, Iterable
+
+from .functions import Function, Lambda, MemoLambda
+from .macros import Macro
+from .programs import Combination, Program, Sequence, Symbol
+from .values import Value
+
+if TYPE_CHECKING:
+    from .evaluators import Evaluator
+    from .interpreters import Interpreter
+
+
+class Unserializable(Exception):
+    """The function captures something which cannot be sent to worker processes, so it is applied serially."""
+
+
+def freeNames(program: Program, bound: frozenset[str] = frozenset()) -> set[str]:
+    """Collect the symbol names used in a program which are not bound by lambda parameters inside it."""
+
+    from .macros import LAMBDAS
+
+    if isinstance(program, Symbol):
+        return set() if program.name in bound else {program.name}
+    if not isinstance(program, Combination | Sequence):
+        return set()
+    items = program.items
+    if isinstance(program, Combination) and len(items) == 3 and isinstance(items[0], Symbol) and items[0].name in LAMBDAS \
+            and isinstance(items[1], Combination) and all(isinstance(p, Symbol) for p in items[1].items):
+        return freeNames(items[2], bound | {p.name for p in items[1].items})
+    result = set()
+    for item in items:
+        result |= freeNames(item, bound)
+    return result
+
+
+class Packer:
+    """
+    Describe a function and the values it captures for worker processes.
+
+    A description is a list of functions, each is (kind, parameters, body, options, captured),
+    where captured maps the free names to ("value", value), ("function", index) or ("builtin", name).
+    Builtins and Python attributes are not sent, workers resolve them by name.
+    """
+
+    def __init__(self) -> None:
+        from .builtins import builtins
+        self.builtins = {id(v): k for k, v in reversed(builtins.items())}
+        self.functions: list[tuple] = []
+        self.indices: dict[int, int] = {}
+
+    def pack(self, func: Function) -> int:
+        index = self.indices.get(id(func))
+        if index is not None:
+            return index
+
+        from .compilers import Closure
+        if isinstance(func, MemoLambda):
+            kind, body, options = "memo", func.body, {
+                "maxsize": func.maxsize, "ttl": func.ttl}
+        elif isinstance(func, Lambda):
+            kind, body, options = "lambda", func.body, {}
+        elif isinstance(func, Closure) and func.program is not None:
+            kind, body, options = "lambda", func.program, {}
+        elif isinstance(func, Macro):
+            kind, body, options = "macro", func.body, {}
+        else:
+            raise Unserializable(f"Cannot send function {func!r}.")
+
+        index = self.indices[id(func)] = len(self.functions)
+        captured: dict[str, tuple] = {}
+        self.functions.append(
+            (kind, list(func.parameters), body, options, captured))
+        if kind != "macro":  # macros do not capture environments
+            for name in freeNames(body, frozenset(func.parameters)):
+                ref = self.capture(name, func.eval)
+                if ref is not None:
+                    captured[name] = ref
+        return index
+
+    def capture(self, name: str, eval: "Evaluator") -> tuple | None:
+        try:
+            value = eval.symbol(name)
+        except AssertionError:  # defined at run time
+            return None
+        if self.builtins.get(id(value)) == name or ":" in name:
+            return None  # resolved by the worker
+        if isinstance(value, Function):
+            builtin = self.builtins.get(id(value))
+            return ("builtin", builtin) if builtin is not None else ("function", self.pack(value))
+        return ("value", value)
+
+
+def build(functions: list[tuple], eval: "Evaluator") -> Function:
+    """Create the described functions in fresh sub-evaluators, return the first one."""
+
+    envs = [eval.sub() for _ in functions]
+    created: list[Function] = []
+    for (kind, parameters, body, options, _), env in zip(functions, envs):
+        if kind == "macro":
+            created.append(Macro(parameters, body))
+        elif kind == "memo":
+            created.append(MemoLambda(parameters, body, env, **options))
+        else:
+            created.append(env.evaluate(Combination(
+                [Symbol("lambda"), Combination([Symbol(p) for p in parameters]), body])))
+
+    from .builtins import builtins
+    for (_, _, _, _, captured), env in zip(functions, envs):
+        for name, (kind, value) in captured.items():
+            env.symbol(name, value if kind == "value" else created[value] if kind == "function" else builtins[value])
+    return created[0]
+
+
+WORKERS: dict[str, "Interpreter"] = {}  # warm interpreters of a worker process, by engine
+
+
+def work(engine: str, functions: list[tuple], chunk: list[tuple[Value, ...]]) -> list[Value]:
+    interpreter = WORKERS.get(engine)
+    if interpreter is None:
+        from .interpreters import Interpreter
+        interpreter = WORKERS[engine] = Interpreter(engine)
+    eval = interpreter.evaluator
+    func = build(functions, eval)
+    return [func(*args, eval=eval) for args in chunk]
+
+
+class Pool:
+    """
+    Process pool applying Scheme functions to independent arguments, in the order of the arguments.
+
+    The function is sent as its syntax tree and captured values, and applied in warm interpreters of the workers,
+    so it should be pure: definitions and other side effects stay in the worker processes.
+    Functions which cannot be sent, and small inputs, are applied serially in the calling process.
+    """
+
+    def __init__(self, workers: int | None = None, chunks: int = 4) -> None:
+        self.workers = workers if workers is not None else (
+            os.cpu_count() or 1)
+        self.chunks = chunks  # chunks per worker, to balance uneven items
+        self.executor: ProcessPoolExecutor | None = None
+
+    def pack(self, func: Function) -> list[tuple] | None:
+        try:
+            packer = Packer()
+            packer.pack(func)
+            pickle.dumps(packer.functions)
+            return packer.functions
+        except (Unserializable, pickle.PicklingError, TypeError, AttributeError):
+            return None
+
+    def map(self, func: Function, arguments: Iterable[tuple[Value, ...]], eval: "Evaluator") -> list[Value]:
+        arguments = list(arguments)
+        functions = self.pack(func) if self.workers > 1 and len(
+            arguments) > 1 else None
+        if functions is None:
+            call = func.bind(eval)
+            return [call(*args) for args in arguments]
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        size = max(1, math.ceil(len(arguments) / (self.workers * self.chunks)))
+        chunks = [arguments[i:i + size]
+                  for i in range(0, len(arguments), size)]
+        engine = eval.interpreter.engine if eval.interpreter is not None else "tree"
+        result = []
+        for values in self.executor.map(work, [engine] * len(chunks), [functions] * len(chunks), chunks):
+            result.extend(values)
+        return result
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+POOL = Pool()
@@ -0,0 +1,206 @@
+from dataclasses import dataclass
+import sys
+from time import perf_counter
+from typing import Callable
+
+from .functions import Function, Lambda, MemoLambda, Numeric, Tail
+from .evaluators import Evaluator
+
+
+@dataclass
+class Entry:
+    """Profile of one Scheme-level name, times are in seconds."""
+
+    name: str
+    calls: int = 0
+    inclusive: float = 0
+    exclusive: float = 0
+    blocks: int = 0  # net memory blocks allocated by the calls, including nested calls
+
+
+class Frame:
+    __slots__ = ("name", "start", "children", "blocks")
+
+    def __init__(self, name: str, start: float, blocks: int) -> None:
+        self.name = name
+        self.start = start
+        self.children = 0.0
+        self.blocks = blocks
+
+
+class Profiler:
+    """
+    Attribute time, calls and allocated memory blocks to Scheme functions, named by their defined or builtin names.
+
+    Enabling the profiler replaces the methods calling functions (`Function.invoke`, `Function.__call__`,
+    the lambda and closure invocations, and the evaluator trampoline) with timing wrappers, and disabling restores them,
+    so the profiler costs nothing when it is not enabled.
+    A lambda called in tail position replaces the frame of the lambda which made the tail call, as the evaluator does.
+    Frames of translated native code are not split: they are attributed to the lambda which entered the native code.
+    """
+
+    active: "Profiler | None" = None
+
+    def __init__(self) -> None:
+        self.entries: dict[str, Entry] = {}
+        self.stacks: dict[str, float] = {}  # collapsed stack -> exclusive seconds
+        self.stack: list[Frame] = []
+        self.bases: list[int] = []  # stack sizes when each trampoline loop starts
+        self.names: dict[int, tuple[Function, str]] = {}
+        self.patches: list[tuple[type, str, Callable]] = []
+
+    def name(self, func: Function, eval: Evaluator | None) -> str:
+        cached = self.names.get(id(func))
+        if cached is not None and cached[0] is func:
+            return cached[1]
+
+        from .builtins import builtins
+        result = None
+        for name, value in builtins.items():
+            if value is func:
+                result = name
+                break
+        else:
+            root = getattr(func, "eval", None) or eval
+            while root is not None and root.parent is not None:
+                root = root.parent
+            if root is not None:
+                for name, value in root.symbols.items():
+                    if value is func:
+                        result = name
+                        break
+        if result is None:
+            result = repr(func)
+        self.names[id(func)] = (func, result)  # keep the function alive, so the id is not reused
+        return result
+
+    def enter(self, name: str) -> None:
+        self.stack.append(Frame(name, perf_counter(), sys.getallocatedblocks()))
+
+    def exit(self) -> None:
+        end = perf_counter()
+        frame = self.stack.pop()
+        elapsed = end - frame.start
+        exclusive = elapsed - frame.children
+
+        entry = self.entries.get(frame.name)
+        if entry is None:
+            entry = self.entries[frame.name] = Entry(frame.name)
+        entry.calls += 1
+        entry.exclusive += exclusive
+        if all(f.name != frame.name for f in self.stack):  # count recursive calls once
+            entry.inclusive += elapsed
+            entry.blocks += sys.getallocatedblocks() - frame.blocks
+
+        key = ";".join([*(f.name for f in self.stack), frame.name])
+        self.stacks[key] = self.stacks.get(key, 0) + exclusive
+        if self.stack:
+            self.stack[-1].children += elapsed
+
+    def unwind(self, size: int) -> None:
+        while len(self.stack) > size:
+            self.exit()
+
+    def patch(self, cls: type, name: str, wrapper: Callable[[Callable], Callable]) -> None:
+        original = cls.__dict__[name]
+        self.patches.append((cls, name, original))
+        setattr(cls, name, wrapper(original))
+
+    def enable(self) -> None:
+        assert Profiler.active is None, "Another profiler is enabled."
+        Profiler.active = self
+        from .compilers import Closure
+
+        def invoke(original):
+            def wrapper(func, *args, eval):
+                self.enter(self.name(func, eval))
+                try:
+                    return original(func, *args, eval=eval)
+                finally:
+                    self.exit()
+            return wrapper
+
+        def invokeLambda(original):
+            def wrapper(func, *args, eval):
+                # a lambda called by the trampoline is in tail position, it replaces the lambdas called before in the loop
+                self.unwind(self.bases[-1] if self.bases else 0)
+                self.enter(self.name(func, eval))
+                try:
+                    result = original(func, *args, eval=eval)
+                except BaseException:
+                    self.exit()
+                    raise
+                if type(result) is not Tail:
+                    self.exit()
+                return result  # the frame is exited when the trampoline finishes the body
+            return wrapper
+
+        def invokeClosure(original):
+            def wrapper(func, args):
+                self.enter(self.name(func, func.eval))
+                try:
+                    return original(func, args)
+                finally:
+                    self.exit()
+            return wrapper
+
+        def call(original):
+            def wrapper(func, *args, eval):
+                size = len(self.stack)
+                self.bases.append(size)
+                try:
+                    return original(func, *args, eval=eval)
+                finally:
+                    self.bases.pop()
+                    self.unwind(size)
+            return wrapper
+
+        def evaluate(original):
+            def wrapper(eval, program):
+                size = len(self.stack)
+                self.bases.append(size)
+                try:
+                    return original(eval, program)
+                finally:
+                    self.bases.pop()
+                    self.unwind(size)
+            return wrapper
+
+        self.patch(Function, "invoke", invoke)
+        self.patch(Numeric, "invoke", invoke)
+        self.patch(Function, "__call__", call)
+        self.patch(Lambda, "invoke", invokeLambda)
+        self.patch(MemoLambda, "invoke", invoke)  # returns values, not tail calls
+        self.patch(Closure, "run", invokeClosure)
+        self.patch(Evaluator, "evaluate", evaluate)
+
+    def disable(self) -> None:
+        for cls, name, original in reversed(self.patches):
+            setattr(cls, name, original)
+        self.patches.clear()
+        self.unwind(0)
+        Profiler.active = None
+
+    def __enter__(self) -> "Profiler":
+        self.enable()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.disable()
+
+    def report(self, limit: int | None = None) -> str:
+        """Format the entries as a table sorted by exclusive time, times are in milliseconds."""
+
+        entries = sorted(self.entries.values(),
+                         key=lambda e: e.exclusive, reverse=True)[:limit]
+        lines = [f"{'calls':>10} {'inclusive':>12} {'exclusive':>12} {'blocks':>10}  name"]
+        for e in entries:
+            name = e.name if len(e.name) <= 60 else e.name[:57] + "..."
+            lines.append(
+                f"{e.calls:>10} {e.inclusive * 1000:>12.3f} {e.exclusive * 1000:>12.3f} {e.blocks:>10}  {name}")
+        return "\n".join(lines)
+
+    def collapsed(self) -> list[str]:
+        """Export the stacks in the collapsed format of flame graph tools, weighted by exclusive microseconds."""
+
+        return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in self.stacks.items() if round(seconds * 1e6) > 0]
@@ -1,47 +1,96 @@
+from abc import ABC
+from dataclasses import dataclass
+
 from .tokens import Token, LEFT, RIGHT
+from .values import Value
+
+
+class Program(ABC):
+    """Base class of syntax tree nodes."""
+
+    resolved = None  # the layout whose frames the symbols in this node are resolved for
+    line = None  # 1-based position in the source, set by the parser
+    column = None
+
+    def location(self) -> str:
+        """Describe the position for error messages, empty if it is unknown."""
+
+        return f" at line {self.line}, column {self.column}" if self.line is not None else ""
+
+    def position(self) -> dict | None:
+        # pickled with the syntax, unlike the evaluator caches
+        return {"line": self.line, "column": self.column} if self.line is not None else None
+
+    def substitute(self, mapping: dict[str, "Program"]) -> "Program":
+        return self
+
+
+@dataclass(eq=False)
+class Atom(Program, ABC):
+    token: Token
+
+    def __repr__(self) -> str:
+        return str(self.token)
+
+    # pickle only the syntax, not the evaluator caches (`resolved`, `address`) of the node
+    def __reduce__(self):
+        return type(self), (self.token,), self.position()
+
+
+@dataclass(eq=False, repr=False)
+class Literal(Atom):
+    value: Value
+
+    def __reduce__(self):
+        return Literal, (self.token, self.value), self.position()
+
+
+@dataclass(eq=False, repr=False)
+class Symbol(Atom):
+    address = None  # (layout, depth, slot) resolved by the evaluator
+
+    @property
+    def name(self) -> str:
+        return str(self.token)
+
+    def substitute(self, mapping: dict[str, Program]) -> Program:
+        return mapping.get(self.token, self)
+
+
+@dataclass(eq=False)
+class Combination(Program):
+    items: list[Program]
+
+    cache = None  # (layout, version, function, lazy) of the operator, cached by the evaluator
+    translation = None  # (source, code) of the loop translated from this node, cached by the translator
+
+    @property
+    def operator(self) -> Program:
+        return self.items[0]
+
+    @property
+    def operands(self) -> list[Program]:
+        return self.items[1:]
+
+    def substitute(self, mapping: dict[str, Program]) -> Program:
+        return Combination([item.substitute(mapping) for item in self.items])
+
+    def __reduce__(self):
+        return Combination, (self.items,), self.position()
+
+    def __repr__(self) -> str:
+        return " ".join([LEFT, *(repr(item) for item in self.items), RIGHT])
+
+
+@dataclass(eq=False)
+class Sequence(Program):
+    items: list[Program]
+
+    def substitute(self, mapping: dict[str, Program]) -> Program:
+        return Sequence([item.substitute(mapping) for item in self.items])
 
+    def __reduce__(self):
+        return Sequence, (self.items,)
 
-class Program(list[Token]):
-    def __getitem__(self, key):
-        if isinstance(key, int):
-            return super().__getitem__(key)
-        if isinstance(key, slice):
-            return Program(super().__getitem__(key))
-        else:
-            raise TypeError
-
-    def missingRight(self) -> int | None:
-        cnt = 0
-        for token in self:
-            if token == LEFT:
-                cnt += 1
-            elif token == RIGHT:
-                if cnt <= 0:
-                    return None
-                cnt -= 1
-        return cnt
-
-    def valid(self):
-        return self.missingRight() == 0
-
-    def combination(self):
-        return len(self) > 1 and self[0] == LEFT and self[-1] == RIGHT
-
-    def atomic(self):
-        return len(self) == 1
-
-    def split(self) -> list["Program"]:
-        target = self[1:-1] if self.combination() else self
-        result, st = [], []
-
-        for i, token in enumerate(target):
-            if token == LEFT:
-                st.append(i)
-            elif token == RIGHT:
-                bg = st.pop()
-                if not st:
-                    result.append(target[bg:i+1])
-            elif not st:
-                result.append(target[i:i+1])
-
-        return result
+    def __repr__(self) -> str:
+        return " ".join(repr(item) for item in self.items)
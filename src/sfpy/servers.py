@@ -0,0 +1,136 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import json
+import os
+import socketserver
+import stat
+import statistics
+import sys
+from threading import Lock
+from time import perf_counter
+from typing import Callable, TextIO
+
+from .interpreters import Interpreter
+from .values import Value
+
+
+class Metrics:
+    """Latencies of recent requests, in microseconds."""
+
+    def __init__(self, maxlen: int = 10000) -> None:
+        self.latencies: deque[float] = deque(maxlen=maxlen)
+        self.requests = 0
+        self.errors = 0
+        self.lock = Lock()
+
+    def record(self, latency: float, error: bool) -> None:
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.latencies.append(latency)
+
+    def summary(self) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            result = {"requests": self.requests, "errors": self.errors}
+        if latencies:
+            result |= {"mean": statistics.fmean(latencies), "p50": latencies[len(latencies) // 2],
+                       "p99": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)], "max": latencies[-1]}
+        return result
+
+
+class Server:
+    """
+    Evaluate requests of a line-delimited JSON protocol in a long-lived interpreter.
+
+    Each request `{"id": ..., "expr": "..."}` is evaluated in a new child of the root evaluator,
+    so it reads the preloaded global definitions, and its own definitions are dropped after the request.
+    The response is `{"id": ..., "result": "...", "latency": {...}}` or `{"id": ..., "error": "..."}`,
+    latencies are in microseconds. `{"id": ..., "op": "stats"}` returns the latency metrics of recent requests and the cache counters.
+    """
+
+    def __init__(self, interpreter: Interpreter, workers: int = 8) -> None:
+        self.interpreter = interpreter
+        self.metrics = Metrics()
+        self.executor = ThreadPoolExecutor(workers)
+
+    def evaluate(self, request: dict) -> dict:
+        start = perf_counter()
+        program = self.interpreter.load(request["expr"])
+        parsed = perf_counter()
+        result = self.interpreter.evaluator.sub().evaluate(program)
+        assert isinstance(
+            result, Value), f"Unexpected evaluated value: {result}"
+        end = perf_counter()
+        return {"result": repr(result), "latency": {"parse": (parsed - start) * 1e6, "evaluate": (end - parsed) * 1e6, "total": (end - start) * 1e6}}
+
+    def handle(self, line: str) -> str:
+        start = perf_counter()
+        id = None
+        try:
+            request = json.loads(line)
+            assert isinstance(request, dict), "The request must be an object."
+            id = request.get("id")
+            if request.get("op") == "stats":
+                response = {"stats": self.metrics.summary() | {"caches": self.interpreter.stats()}}
+            else:
+                assert isinstance(request.get("expr"), str), "The request must have an expression."
+                response = self.evaluate(request)
+            error = False
+        except Exception as ex:
+            response = {"error": f"{type(ex).__name__}: {ex}"}
+            error = True
+        self.metrics.record((perf_counter() - start) * 1e6, error)
+        return json.dumps({"id": id, **response})
+
+    def submit(self, line: str, reply: Callable[[str], None]) -> Future:
+        """Handle the request in the thread pool, and reply the response when it is done."""
+
+        return self.executor.submit(lambda: reply(self.handle(line)))
+
+    def serveStream(self, input: TextIO, output: TextIO) -> None:
+        """Serve requests from lines of the input, responses are written in the order they complete."""
+
+        lock = Lock()
+
+        def reply(response: str) -> None:
+            with lock:
+                output.write(response + "\n")
+                output.flush()
+
+        for line in input:
+            if line.strip():
+                self.submit(line, reply)
+        self.executor.shutdown(wait=True)
+
+    def serveSocket(self, path: str) -> None:
+        """Serve requests from connections to a Unix socket, each connection is a stream of requests and responses."""
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                lock = Lock()
+                pending = []
+
+                def reply(response: str) -> None:
+                    with lock:
+                        self.wfile.write((response + "\n").encode())
+                        self.wfile.flush()
+
+                for line in self.rfile:
+                    line = line.decode()
+                    if line.strip():
+                        pending.append(server.submit(line, reply))
+                wait(pending)  # keep the connection until all responses are written
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)  # stale socket of a previous server
+
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix:
+            unix.daemon_threads = True
+            print(f"Serving on {path}", file=sys.stderr)
+            try:
+                unix.serve_forever()
+            finally:
+                self.executor.shutdown(wait=False)
@@ -0,0 +1,136 @@
+import io
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import TYPE_CHECKING, Iterable
+
+from . import __version__
+
+if TYPE_CHECKING:
+    from .interpreters import Interpreter
+
+
+class Pickler(pickle.Pickler):
+    """Pickle values of an environment, referring to the interpreter, builtins and Python attributes by name."""
+
+    def __init__(self, file, interpreter: "Interpreter") -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        from .builtins import builtins
+        from .interops import ATTRIBUTES
+        root = interpreter.evaluator
+        self.references: dict[int, tuple] = {
+            id(interpreter): ("interpreter",), id(root): ("root",), id(root.layout): ("layout",)}
+        if hasattr(root, "compiler"):
+            self.references[id(root.compiler)] = ("compiler",)
+        for name, value in reversed(builtins.items()):
+            self.references[id(value)] = ("builtin", name)
+        for name, value in list(ATTRIBUTES.items.items()):
+            if value is not None:
+                self.references.setdefault(id(value), ("attribute", name))
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+class Unpickler(pickle.Unpickler):
+    def __init__(self, file, interpreter: "Interpreter") -> None:
+        super().__init__(file)
+        from .builtins import builtins
+        self.interpreter = interpreter
+        self.builtins = builtins
+
+    def persistent_load(self, pid):
+        match pid:
+            case ("interpreter",):
+                return self.interpreter
+            case ("root",):
+                return self.interpreter.evaluator
+            case ("layout",):
+                return self.interpreter.evaluator.layout
+            case ("compiler",):
+                return self.interpreter.evaluator.compiler
+            case ("builtin", name):
+                return self.builtins[name]
+            case ("attribute", name):
+                from .interops import ATTRIBUTES
+                result = ATTRIBUTES.resolve(name)
+                assert result is not None, f"Cannot resolve Python attribute: '{name}'"
+                return result
+        raise pickle.UnpicklingError(f"Unknown reference: {pid}")
+
+
+class Snapshot:
+    """
+    Saved global environment of an interpreter, restored instead of evaluating the loaded source files again.
+
+    A snapshot holds the global definitions which are not builtins, lambdas are pickled as their syntax trees
+    and environments, and builtins and Python attributes by their names. It is keyed by the engine,
+    the resolved paths, modification times and sizes of the loaded source files and the sfpy version,
+    and is written to a temporary file and renamed, so concurrent interpreters never read a partial snapshot.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.skipped: dict[str, str] = {}  # names not saved in the last snapshot, and the reasons
+
+    def key(self, interpreter: "Interpreter", sources: Iterable[Path]) -> tuple:
+        files = []
+        for source in sources:
+            stat = source.stat()
+            files.append((str(source.resolve()), stat.st_mtime_ns, stat.st_size))
+        return (interpreter.engine, interpreter.expander is not None, tuple(files), __version__)
+
+    def restore(self, interpreter: "Interpreter", sources: Iterable[Path]) -> bool:
+        """Define the saved names in the global environment if the snapshot is up to date with the sources."""
+
+        try:
+            file = self.path.open("rb")
+        except OSError:
+            return False
+        with file:
+            try:
+                if pickle.load(file) != self.key(interpreter, sources):
+                    return False
+                symbols = Unpickler(file, interpreter).load()
+            except Exception:
+                return False
+
+        root = interpreter.evaluator
+        for name, value in symbols.items():
+            root.symbol(name, value)
+        return True
+
+    def save(self, interpreter: "Interpreter", sources: Iterable[Path]) -> None:
+        """Save the global definitions which are not builtins, definitions which cannot be pickled are skipped."""
+
+        from .builtins import builtins
+        symbols = {name: value for name, value in interpreter.evaluator.symbols.items()
+                   if builtins.get(name) is not value}
+
+        self.skipped = {}
+        for name, value in symbols.items():
+            try:
+                Pickler(io.BytesIO(), interpreter).dump(value)
+            except Exception as ex:
+                self.skipped[name] = f"{type(ex).__name__}: {ex}"
+        for name in self.skipped:
+            del symbols[name]
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(
+                prefix=f".{self.path.name}.", dir=self.path.parent)
+        except OSError:  # not writable, run without the snapshot
+            return
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(self.key(interpreter, sources), file, pickle.HIGHEST_PROTOCOL)
+                Pickler(file, interpreter).dump(symbols)
+            os.replace(temp, self.path)
+        except Exception:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
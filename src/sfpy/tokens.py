@@ -1,5 +1,6 @@
 class Token(str):
-    pass
+    def __reduce__(self):
+        return Token, (str(self),)
 
 
 FALSE = Token("#f")
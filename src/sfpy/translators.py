@@ -0,0 +1,399 @@
+from collections import OrderedDict, deque
+from typing import Callable, TYPE_CHECKING
+
+from .programs import Combination, Literal, Program, Symbol
+from .values import Bool, Complex, Float, Int, Value
+
+if TYPE_CHECKING:
+    from .functions import Lambda
+
+
+NUMBER = "number"
+BOOL = "bool"
+ANY = "any"
+UNKNOWN = "unknown"
+
+NUMBERS = (Int, Float, Complex)
+
+
+class Unsupported(Exception):
+    """The lambda uses something the translator cannot handle, so it stays interpreted."""
+
+
+def divide(v1, v2):
+    assert v2 != 0, "The divisor cannot be zero."
+    return v1 / v2
+
+
+def divideInt(v1, v2):
+    assert v2 != 0, "The divisor cannot be zero."
+    return v1 // v2
+
+
+def modulo(v1, v2):
+    assert v2 != 0, "The divisor cannot be zero."
+    return v1 % v2
+
+
+def equal(v1, v2):
+    return type(v1) is type(v2) and v1 == v2
+
+
+# builtin name -> (operand type, result type, minimum operands, variadic, code template)
+PRIMITIVES: dict[str, tuple[str, str, int, bool, Callable[[list[str]], str]]] = {
+    "+": (NUMBER, NUMBER, 2, True, lambda a: f"(0 + {' + '.join(a)})"),
+    "-": (NUMBER, NUMBER, 2, False, lambda a: f"({a[0]} - {a[1]})"),
+    "*": (NUMBER, NUMBER, 2, True, lambda a: f"({' * '.join(a)})"),
+    "/": (NUMBER, NUMBER, 2, False, lambda a: f"_divide({a[0]}, {a[1]})"),
+    "//": (NUMBER, NUMBER, 2, False, lambda a: f"_divideInt({a[0]}, {a[1]})"),
+    "%": (NUMBER, NUMBER, 2, False, lambda a: f"_modulo({a[0]}, {a[1]})"),
+    "^": (NUMBER, NUMBER, 2, False, lambda a: f"({a[0]} ** {a[1]})"),
+    "max": (NUMBER, NUMBER, 2, True, lambda a: f"max({', '.join(a)})"),
+    "min": (NUMBER, NUMBER, 2, True, lambda a: f"min({', '.join(a)})"),
+    "<": (NUMBER, BOOL, 2, False, lambda a: f"({a[0]} < {a[1]})"),
+    "<=": (NUMBER, BOOL, 2, False, lambda a: f"({a[0]} <= {a[1]})"),
+    ">": (NUMBER, BOOL, 2, False, lambda a: f"({a[0]} > {a[1]})"),
+    ">=": (NUMBER, BOOL, 2, False, lambda a: f"({a[0]} >= {a[1]})"),
+    "=": (ANY, BOOL, 2, False, lambda a: f"_equal({a[0]}, {a[1]})"),
+    "!=": (ANY, BOOL, 2, False, lambda a: f"(not _equal({a[0]}, {a[1]}))"),
+    "not": (BOOL, BOOL, 1, False, lambda a: f"(not {a[0]})"),
+    "and": (BOOL, BOOL, 2, True, lambda a: f"all(({', '.join(a)},))"),
+    "or": (BOOL, BOOL, 2, True, lambda a: f"any(({', '.join(a)},))"),
+}
+
+
+class Translation:
+    """
+    Translate the body of one lambda into Python source, inferring number / bool types of its parameters.
+
+    The loop of a named let calls itself by `loop`, a name in its own frame, and may read the names of outer frames,
+    whose current values become constants, so it is only translated for one evaluation of the let.
+    """
+
+    def __init__(self, func: "Lambda", name: str, types: dict[str, str], result: str, loop: str | None = None,
+                 translator: "Translator | None" = None) -> None:
+        from .builtins import builtins
+        self.func = func
+        self.translator = translator
+        self.name = name
+        self.loop = loop
+        self.root = func.eval
+        while self.root.parent is not None:
+            self.root = self.root.parent
+        self.builtins = builtins
+        self.parameters = {p: f"p{i}" for i, p in enumerate(func.parameters)}
+        self.types = types
+        self.result = result
+        self.results: list[str] = []
+        self.constants: list = []
+        self.globals: dict[str, Value] = {}
+        self.callees: list["Lambda"] = []
+        self.changed = False
+
+    def resolve(self, name: str) -> Value:
+        if self.func.layout.address(name)[2] is not None or self.func.layout.shadows(name):
+            raise Unsupported(f"Symbol '{name}' is not global.")
+        value = self.root.symbols.get(name)
+        if value is None:
+            raise Unsupported(f"Unknown symbol '{name}'.")
+        self.globals[name] = value
+        return value
+
+    def primitive(self, program: Program) -> "str | Lambda":
+        """
+        Get the builtin name of the operator of a combination, or the called lambda (itself or a translated one).
+
+        A called lambda defined at the root which is not translated yet is translated first, as it is hot as well.
+        """
+
+        if not isinstance(program, Combination) or not program.items:
+            raise Unsupported(f"Unsupported expression {program!r}.")
+        operator = program.operator
+        if not isinstance(operator, Symbol) or operator.name in self.parameters:
+            raise Unsupported(f"Unsupported operator {operator!r}.")
+        if operator.name == self.loop:
+            return self.func
+        value = self.resolve(operator.name)
+        if value is self.func:
+            return value
+        if isinstance(value, type(self.func)) and value.eval is self.root and value.threshold is not None:
+            if value.native is None and self.translator is not None:
+                value.native = self.translator.callee(value)
+            if value.native is not None:
+                return value
+        for name in [*PRIMITIVES, "if"]:
+            if self.builtins.get(name) is value:
+                return name
+        raise Unsupported(f"Unsupported function {operator!r}.")
+
+    def operand(self, program: Program, expected: str) -> str:
+        code, kind = self.expression(program)
+        if expected == ANY:
+            pass
+        elif kind == UNKNOWN and isinstance(program, Symbol):
+            self.types[program.name] = expected
+            self.changed = True
+        elif kind == UNKNOWN:  # a self call, whose result type is inferred from the other results
+            pass
+        elif kind != expected:
+            raise Unsupported(
+                f"Expected {expected} but got {kind} for {program!r}.")
+        return code
+
+    def call(self, program: Combination) -> list[str]:
+        operands = program.operands
+        if len(operands) != len(self.parameters):
+            raise Unsupported("Self call with a wrong number of arguments.")
+
+        result = []
+        for operand, parameter in zip(operands, self.parameters):
+            expected = self.types.get(parameter, UNKNOWN)
+            if expected != UNKNOWN:
+                result.append(self.operand(operand, expected))
+                continue
+            code, kind = self.expression(operand)
+            if kind not in {NUMBER, BOOL}:
+                raise Unsupported(
+                    f"Cannot infer the type of parameter '{parameter}'.")
+            self.types[parameter] = kind
+            self.changed = True
+            result.append(code)
+        return result
+
+    def expression(self, program: Program) -> tuple[str, str]:
+        if isinstance(program, Literal):
+            value = program.value
+            if type(value) is Bool:
+                return repr(value.raw), BOOL
+            if type(value) in NUMBERS:
+                self.constants.append(value.raw)
+                return f"_k[{len(self.constants) - 1}]", NUMBER
+            raise Unsupported(f"Unsupported literal {program!r}.")
+
+        if isinstance(program, Symbol):
+            if program.name in self.parameters:
+                return self.parameters[program.name], self.types.get(program.name, UNKNOWN)
+            if self.loop is not None and self.func.layout.address(program.name)[2] is not None:
+                value = self.func.eval.symbol(program.name)
+                if type(value) is Bool:
+                    return repr(value.raw), BOOL
+                if type(value) in NUMBERS:
+                    self.constants.append(value.raw)
+                    return f"_k[{len(self.constants) - 1}]", NUMBER
+            raise Unsupported(f"Unsupported symbol {program!r}.")
+
+        name = self.primitive(program)
+        if name is self.func:
+            return f"_kernel({', '.join(self.call(program))})", self.result
+        if not isinstance(name, str):
+            native = name.native
+            if len(program.operands) != len(native.types):
+                raise Unsupported(
+                    f"Wrong number of arguments for '{program.operator!r}'.")
+            arguments = [self.operand(o, t)
+                         for o, t in zip(program.operands, native.types)]
+            self.callees.append(name)
+            return f"_c[{len(self.callees) - 1}]({', '.join(arguments)})", native.result
+        if name == "if":
+            if len(program.operands) != 3:
+                raise Unsupported("Invalid if expression.")
+            predicate, exprTrue, exprFalse = program.operands
+            p, pk = self.expression(predicate)
+            a, ak = self.expression(exprTrue)
+            b, bk = self.expression(exprFalse)
+            return f"({a} if {self.test(p, pk)} else {b})", ak if ak == bk or bk == UNKNOWN else bk if ak == UNKNOWN else ANY
+
+        operand, result, count, variadic, template = PRIMITIVES[name]
+        operands = program.operands
+        if len(operands) < count or (not variadic and len(operands) != count):
+            raise Unsupported(f"Wrong number of arguments for '{name}'.")
+        return template([self.operand(o, operand) for o in operands]), result
+
+    def test(self, code: str, kind: str) -> str:
+        return code if kind == BOOL else f"({code} is not False)"
+
+    def statements(self, program: Program, indent: str) -> list[str]:
+        """Translate an expression in tail position, self tail calls become loop iterations."""
+
+        if isinstance(program, Combination) and program.items:
+            name = self.primitive(program)
+            if name is self.func:
+                arguments = self.call(program)
+                if not arguments:
+                    return [f"{indent}continue"]
+                targets = ", ".join(self.parameters.values())
+                return [f"{indent}{targets}{',' if len(arguments) == 1 else ''} = {', '.join(arguments)}{',' if len(arguments) == 1 else ''}",
+                        f"{indent}continue"]
+            if name == "if" and len(program.operands) == 3:
+                predicate, exprTrue, exprFalse = program.operands
+                p, pk = self.expression(predicate)
+                return [f"{indent}if {self.test(p, pk)}:",
+                        *self.statements(exprTrue, indent + "    "),
+                        f"{indent}else:",
+                        *self.statements(exprFalse, indent + "    ")]
+
+        code, kind = self.expression(program)
+        self.results.append(kind)
+        return [f"{indent}return {code}"]
+
+    def source(self) -> str:
+        parameters = ", ".join(self.parameters.values())
+        lines = [f"def _kernel({parameters}):",
+                 "    while True:",
+                 *self.statements(self.func.body, "        ")]
+        return "\n".join(lines)
+
+
+class Translator:
+    """
+    Translate hot lambdas into native Python functions.
+
+    Supported bodies only use literals, the lambda's own parameters, `if`, arithmetic / comparing / boolean builtins,
+    and calls by global name to the lambda itself (self tail calls become a loop) or to other root lambdas, translated first.
+    The loop of a named let is translated in the same way, when it has run `Lambda.threshold` iterations.
+    The native function checks the argument types, and that the global names and translated lambdas it depends on
+    are unchanged, otherwise it returns None and the lambda falls back to the evaluator, until it is translated again.
+    The names of the last `maxsize` promoted and rejected lambdas are kept for reports, and all of them are counted.
+    """
+
+    maxsize = 256
+
+    def __init__(self) -> None:
+        self.promoted: deque[str] = deque(maxlen=self.maxsize)
+        self.rejected: OrderedDict[str, str] = OrderedDict()
+        self.promotions = 0
+        self.rejections = 0
+        self.pending: set["Lambda"] = set()  # lambdas being translated, whose calls cannot be translated
+
+    def name(self, func: "Lambda") -> str:
+        for name, value in func.eval.symbols.items():
+            if value is func:
+                return name
+        return repr(func)
+
+    def translate(self, func: "Lambda", loop: str | None = None, node: Combination | None = None) -> Callable[..., Value | None] | None:
+        """
+        Translate a lambda, or the loop of a named let which calls itself by the name `loop`.
+
+        A loop is translated again for each evaluation of its form, since it may read other constants,
+        but the compiled code is cached on the `node` of the form, and the loop is promoted only once.
+        """
+
+        name = loop or self.name(func)
+        cached = node.translation if node is not None else None
+        try:
+            native = self.build(func, name, loop, node)
+        except Unsupported as ex:
+            self.reject(name, str(ex))
+            return None
+        except SyntaxError as ex:  # a bug of the translator, the lambda stays interpreted
+            self.reject(name, f"Invalid translation: {ex}")
+            return None
+        self.rejected.pop(name, None)
+        if cached is None or node.translation is not cached:
+            self.promoted.append(name)
+            self.promotions += 1
+        return native
+
+    def reject(self, name: str, reason: str) -> None:
+        rejected = self.rejected
+        rejected[name] = reason
+        rejected.move_to_end(name)
+        self.rejections += 1
+        if len(rejected) > self.maxsize:
+            rejected.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {"promoted": self.promotions, "rejected": self.rejections}
+
+    def callee(self, func: "Lambda") -> Callable[..., Value | None] | None:
+        """Translate a lambda called by a lambda being translated, unless it is being translated itself (mutual recursion)."""
+
+        return None if func in self.pending else self.translate(func)
+
+    def build(self, func: "Lambda", name: str, loop: str | None = None, node: Combination | None = None) -> Callable[..., Value | None]:
+        if func.eval.parent is not None and loop is None:
+            raise Unsupported("Only lambdas defined at the root are translated.")
+
+        self.pending.add(func)
+        try:
+            return self.infer(func, name, loop, node)
+        finally:
+            self.pending.discard(func)
+
+    def infer(self, func: "Lambda", name: str, loop: str | None = None, node: Combination | None = None) -> Callable[..., Value | None]:
+        """Translate until the types are stable, the result type of self calls is inferred from the other results (base cases)."""
+
+        types: dict[str, str] = {}
+        result = UNKNOWN
+        for _ in range(2 * len(func.parameters) + 3):
+            translation = Translation(func, name, types, result, loop, self)
+            source = translation.source()
+            kinds = set(translation.results) - {UNKNOWN}
+            actual = kinds.pop() if len(kinds) == 1 else ANY if kinds else UNKNOWN
+            if translation.changed or actual != result:
+                result = actual
+                continue
+            untyped = [p for p in func.parameters if types.get(
+                p, UNKNOWN) == UNKNOWN]
+            if not untyped:
+                if result == UNKNOWN:
+                    raise Unsupported("Cannot infer the result type.")
+                return self.load(func, translation, source, node)
+            for p in untyped:
+                types[p] = NUMBER
+
+        raise Unsupported("Types of the lambda are not stable.")
+
+    def load(self, func: "Lambda", translation: Translation, source: str, node: Combination | None = None) -> Callable[..., Value | None]:
+        callees = [(callee, callee.native) for callee in translation.callees]
+        namespace = {"_k": translation.constants, "_c": [native.kernel for _, native in callees], "_divide": divide,
+                     "_divideInt": divideInt, "_modulo": modulo, "_equal": equal}
+        if node is not None and node.translation is not None and node.translation[0] == source:
+            code = node.translation[1]
+        else:
+            code = compile(source, f"<sfpy {translation.name}>", "exec")
+            if node is not None:
+                node.translation = (source, code)
+        exec(code, namespace)
+        kernel = namespace["_kernel"]
+
+        root = translation.root
+        dependencies = translation.globals
+        guards = tuple(NUMBERS if translation.types[p] == NUMBER else (Bool,)
+                       for p in func.parameters)
+        count = len(guards)
+        ensure = Value.ensure
+        state = [root.version]
+
+        def valid() -> bool:
+            if root.version == state[0]:
+                return True
+            if all(root.symbols.get(n) is v for n, v in dependencies.items()) \
+                    and all(callee.native is native and native.valid() for callee, native in callees):
+                state[0] = root.version
+                return True
+            func.native = None
+            func.calls = 0  # offered to the translator again after `threshold` more calls
+            return False
+
+        def native(*args) -> Value | None:
+            if len(args) != count:
+                return None
+            for arg, guard in zip(args, guards):
+                if type(arg) not in guard:
+                    return None
+            if root.version != state[0] and not valid():
+                return None
+            return ensure(kernel(*[arg.raw for arg in args]))
+
+        native.__qualname__ = native.__name__ = f"sfpy_{translation.name}"
+        native.source = source
+        native.kernel = kernel
+        native.types = [translation.types[p] for p in func.parameters]
+        native.result = translation.result
+        native.valid = valid
+        return native
+
+
+TRANSLATOR = Translator()
@@ -4,17 +4,64 @@ from types import NoneType
 from typing import Callable
 
 
+VALUES: list[type["Value"]] = []
+EXACT_TYPES: dict[type, type["Value"]] = {}
+TYPES: dict[type, type["Value"]] = {}
+# loaders of value classes for raw types of lazily imported modules, by top-level module name
+LOADERS: dict[str, Callable[[], object]] = {}
+
+
 def allValues():
-    from .functions import Function
-    return [v for v in globals().values() if inspect.isclass(v) and issubclass(v, Value)] + [Function]
+    return list(VALUES)
+
 
 def allConcreteValues():
-    return [v for v in allValues() if not inspect.isabstract(v) and not ABC in v.__bases__]
+    return [v for v in VALUES if not inspect.isabstract(v) and not ABC in v.__bases__]
+
+
+def dispatch(kind: type) -> type["Value"]:
+    """Get the value class to wrap a raw Python type, the result is cached for each type."""
+
+    result = TYPES.get(kind)
+    if result is None:
+        loader = LOADERS.pop(kind.__module__.partition(".")[0], None)
+        if loader is not None:
+            loader()
+            return dispatch(kind)
+        for item in allConcreteValues():
+            if issubclass(kind, item.__rawType__):
+                result = item
+                break
+        else:
+            result = Object
+        TYPES[kind] = result
+    return result
+
+
+def register(cls: type["Value"], kind: type) -> None:
+    """Wrap raw values of a type by the value class, for raw types imported after the class is defined."""
+
+    EXACT_TYPES[kind] = cls
+    TYPES.clear()
+    TYPES.update(EXACT_TYPES)
 
 
 class Value(ABC):
+    __slots__ = ("raw",)
     __rawType__ = object
 
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        VALUES.append(cls)
+        if cls in allConcreteValues():
+            kinds = cls.__rawType__ if isinstance(
+                cls.__rawType__, tuple) else (cls.__rawType__,)
+            for kind in kinds:
+                if isinstance(kind, type):
+                    EXACT_TYPES.setdefault(kind, cls)
+        TYPES.clear()
+        TYPES.update(EXACT_TYPES)
+
     def __init__(self, raw) -> None:
         if not isinstance(raw, self.__rawType__):
             raise Exception(
@@ -27,20 +74,29 @@ class Value(ABC):
     def __eq__(self, other: object) -> bool:
         return isinstance(other, type(self)) and other.raw == self.raw
 
+    def __hash__(self) -> int:
+        return hash((type(self), self.raw))
+
     def __repr__(self) -> str:
         return f"{type(self).__qualname__}({repr(self.raw)})"
 
+    def __reduce__(self):
+        return type(self), (self.raw,)
+
     @classmethod
     def ensure(cls, raw) -> "Value":
         if isinstance(raw, Value):
             return raw
-        for item in allConcreteValues():
-            if isinstance(raw, item.__rawType__):
-                return item(raw)
-        return Object(raw)
+        kind = type(raw)
+        if kind is bool:
+            return TRUE if raw else FALSE
+        if kind is int and INT_MIN <= raw < INT_MAX:
+            return INTS[raw - INT_MIN]
+        return (TYPES.get(kind) or dispatch(kind))(raw)
 
 
 class Bool(Value):
+    __slots__ = ()
     __rawType__ = bool
 
     def __repr__(self) -> str:
@@ -50,25 +106,33 @@ class Bool(Value):
     def __eq__(self, other: object) -> bool:
         return isinstance(other, Bool) and other.raw == self.raw
 
+    __hash__ = Value.__hash__
+
 
 class Number(Value, ABC):
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return repr(self.raw)
 
 
 class Int(Number):
+    __slots__ = ()
     __rawType__ = int
 
 
 class Float(Number):
+    __slots__ = ()
     __rawType__ = float
 
 
 class Complex(Number):
+    __slots__ = ()
     __rawType__ = complex
 
 
 class Empty(Value):
+    __slots__ = ()
     __rawType__ = NoneType
 
     def __repr__(self) -> str:
@@ -76,6 +140,7 @@ class Empty(Value):
 
 
 class String(Value):
+    __slots__ = ()
     __rawType__ = str
 
     def __repr__(self) -> str:
@@ -85,11 +150,91 @@ class String(Value):
         return len(self.raw) > 0 and any(not c.isdigit() for c in self.raw)
 
 
+class List(Value):
+    """
+    Proper list, a segment of a shared tuple of values from an offset, followed by the rest list if any.
+
+    `cdr` moves the offset and `cons` adds a segment before the list, so both take constant time,
+    and the raw tuple of all values is only built when it is used.
+    """
+
+    __slots__ = ("items", "start", "rest", "size")
+    __rawType__ = (tuple, list)
+
+    def __init__(self, raw) -> None:
+        self.items, self.start, self.rest = tuple(map(Value.ensure, raw)), 0, None
+        self.size = len(self.items)
+
+    @classmethod
+    def boxed(cls, items: tuple[Value, ...], start: int = 0, rest: "List | None" = None) -> "List":
+        """Create a list of values which are already boxed, sharing the tuple."""
+
+        result = object.__new__(cls)
+        result.items, result.start, result.rest = items, start, rest
+        result.size = len(items) - start + (rest.size if rest is not None else 0)
+        return result
+
+    @property
+    def raw(self) -> tuple[Value, ...]:
+        try:
+            return RAW.__get__(self)
+        except AttributeError:
+            parts, cur = [], self
+            while cur is not None:
+                parts.append(cur.items[cur.start:] if cur.start else cur.items)
+                cur = cur.rest
+            result = parts[0] if len(parts) == 1 else tuple(item for part in parts for item in part)
+            RAW.__set__(self, result)
+            return result
+
+    def first(self) -> Value:
+        assert self.size, "The argument must be a non-empty list or a pair."
+        return self.items[self.start]
+
+    def tail(self) -> "List":
+        """The list without the first value, sharing the values."""
+
+        assert self.size, "The argument must be a non-empty list or a pair."
+        if self.start + 1 < len(self.items):
+            return List.boxed(self.items, self.start + 1, self.rest)
+        return self.rest if self.rest is not None else NIL
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"({' '.join(map(repr, self.raw))})"
+
+
+class Pair(Value):
+    """Pair whose second item is not a list, i.e., an improper list."""
+
+    __slots__ = ()
+    __rawType__ = tuple
+
+    def __init__(self, car: "Value", cdr: "Value") -> None:
+        super().__init__((car, cdr))
+
+    def __reduce__(self):
+        return Pair, self.raw
+
+    def __repr__(self) -> str:
+        return f"({self.raw[0]!r} . {self.raw[1]!r})"
+
+
 class Object(Value, ABC):
     """Wrapper for unsupported Python values."""
-    pass
+
+    __slots__ = ()
 
 
+RAW = Value.__dict__["raw"]  # the slot of raw values, which lists fill lazily
+
 TRUE = Bool(True)
 FALSE = Bool(False)
 EMPTY = Empty(None)
+NIL = List(())
+
+# preallocated small integers, shared by `Value.ensure` instead of wrapping a new Int each time
+INT_MIN, INT_MAX = -256, 1024
+INTS = [Int(i) for i in range(INT_MIN, INT_MAX)]
@@ -0,0 +1,151 @@
+from functools import reduce
+import math
+import operator
+from typing import Callable, Iterable
+
+from .values import LOADERS, Value, register
+
+numpy = None  # imported by `backend` at the first use of vectors
+LOADED = False
+
+
+class Array(list):
+    """Pure Python fallback storage of vectors when NumPy is not installed."""
+
+    def tolist(self) -> list:
+        return list(self)
+
+
+class Vector(Value):
+    """Numeric vector backed by a NumPy array, or an Array if NumPy is not installed."""
+
+    __slots__ = ()
+    __rawType__ = Array  # the NumPy array type once the backend is loaded
+
+    def __init__(self, raw) -> None:
+        if not LOADED:
+            backend()
+        super().__init__(raw)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Vector) and len(other.raw) == len(self.raw) \
+            and bool(all(a == b for a, b in zip(self.raw.tolist(), other.raw.tolist())))
+
+    def __repr__(self) -> str:
+        items = self.raw.tolist()
+        if len(items) > 20:
+            items = [*items[:10], "...", *items[-10:]]
+        return f"#({' '.join(item if item == '...' else repr(Value.ensure(item)) for item in items)})"
+
+
+def backend():
+    """
+    Import NumPy at the first use of vectors, since it dominates the startup time, return None if it is not installed.
+
+    Vectors are then backed by NumPy arrays, and arrays returned by Python functions are wrapped as vectors.
+    """
+
+    global numpy, LOADED
+    if not LOADED:
+        try:
+            import numpy
+        except ImportError:  # optional, vectors fall back to Python lists
+            numpy = None
+        if numpy is not None:
+            Vector.__rawType__ = numpy.ndarray
+            register(Vector, numpy.ndarray)
+        LOADED = True
+    return numpy
+
+
+LOADERS["numpy"] = backend
+
+
+def create(items: Iterable) -> Vector:
+    if backend() is not None:
+        return Vector(numpy.array(list(items)))
+    return Vector(Array(items))
+
+
+# operator name -> (Python function on items, NumPy ufunc name)
+OPERATORS: dict[str, tuple[Callable, str]] = {
+    "+": (operator.add, "add"),
+    "-": (operator.sub, "subtract"),
+    "*": (operator.mul, "multiply"),
+    "/": (operator.truediv, "true_divide"),
+    "//": (operator.floordiv, "floor_divide"),
+    "%": (operator.mod, "mod"),
+    "^": (operator.pow, "power"),
+    "max": (max, "maximum"),
+    "min": (min, "minimum"),
+    "<": (operator.lt, "less"),
+    "<=": (operator.le, "less_equal"),
+    ">": (operator.gt, "greater"),
+    ">=": (operator.ge, "greater_equal"),
+}
+
+DIVISIONS = {"/", "//", "%"}
+
+
+def elementwise(func: Callable, x, y):
+    if isinstance(x, Array):
+        if isinstance(y, Array):
+            return Array(map(func, x, y))
+        return Array(func(a, y) for a in x)
+    return Array(func(x, b) for b in y)
+
+
+def broadcast(name: str, *values: Value) -> Value:
+    """Apply the arithmetic or comparing operator to vectors and numbers, numbers are broadcast over the vectors."""
+
+    raws = [v.raw for v in values]
+    lengths = [len(raw) for raw in raws if isinstance(raw, Vector.__rawType__)]
+    assert all(n == lengths[0] for n in lengths), \
+        f"The lengths of vectors must be the same, but got {', '.join(map(str, lengths))}."
+    if name in DIVISIONS:
+        divisor = raws[1]
+        assert not (divisor == 0 if not isinstance(divisor, Vector.__rawType__)
+                    else any(d == 0 for d in divisor.tolist())), "The divisor cannot be zero."
+    func, ufunc = OPERATORS[name]
+    if backend() is not None:
+        return Vector(reduce(getattr(numpy, ufunc), raws))
+    return Vector(reduce(lambda x, y: elementwise(func, x, y), raws))
+
+
+def scalar(raw) -> Value:
+    """Box a reduction result, NumPy scalars are converted to Python numbers."""
+
+    return Value.ensure(raw.item() if numpy is not None and isinstance(raw, numpy.generic) else raw)
+
+
+def total(vector: Vector) -> Value:
+    return scalar(vector.raw.sum() if numpy is not None else sum(vector.raw))
+
+
+def mean(vector: Vector) -> Value:
+    assert len(vector.raw) > 0, "Cannot get the mean of an empty vector."
+    return scalar(vector.raw.mean() if numpy is not None else sum(vector.raw) / len(vector.raw))
+
+
+def dot(v1: Vector, v2: Vector) -> Value:
+    assert len(v1.raw) == len(
+        v2.raw), f"The lengths of vectors must be the same, but got {len(v1.raw)} and {len(v2.raw)}."
+    return scalar(numpy.dot(v1.raw, v2.raw) if numpy is not None else sum(map(operator.mul, v1.raw, v2.raw)))
+
+
+def arange(*args: int | float) -> Vector:
+    if backend() is not None:
+        return Vector(numpy.arange(*args))
+    start, end, step = (0, args[0], 1) if len(args) == 1 else (*args, 1)[:3]
+    assert step != 0, "The step cannot be zero."
+    count = max(0, math.ceil((end - start) / step))
+    return Vector(Array(start + i * step for i in range(count)))
+
+
+def load(path: str) -> Vector:
+    """Load numbers separated by whitespaces from a text file."""
+
+    if backend() is not None:
+        return Vector(numpy.fromfile(path, sep=" "))
+    with open(path) as file:
+        return Vector(Array(float(item) for line in file for item in line.split()))
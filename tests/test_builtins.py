@@ -0,0 +1,33 @@
+import pytest
+
+from sfpy.interpreters import Interpreter
+
+ENGINES = ["tree", "closure"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("(cons 1 (list 2 3))", "(1 2 3)"),
+    ("(cdr (cons 1 (cdr (list 2 3 4))))", "(3 4)"),
+    ("(car (cdr (cons 1 (list 2))))", "2"),
+    ("(null? (cdr (cdr (cons 1 (list 2)))))", "#t"),
+    ("(length (cons 0 (cdr (list 1 2 3))))", "3"),
+    ("(map (lambda (x) (* x x)) (cons 1 (cdr (list 2 3))))", "(1 9)"),
+    ("(cons 1 2)", "(1 . 2)"),
+])
+def test_lists(text: str, expected: str):
+    assert repr(Interpreter().interprete(text)) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_long_lists(engine: str):
+    interpreter = Interpreter(engine)
+    interpreter.interprete("(define build (lambda (n acc) (if (= n 0) acc (build (- n 1) (cons n acc)))))")
+    interpreter.interprete("(define sum (lambda (l acc) (if (null? l) acc (sum (cdr l) (+ acc (car l))))))")
+    assert repr(interpreter.interprete("(sum (build 20000 (list)) 0)")) == "200010000"
+    assert repr(interpreter.interprete("(sum (range 20000) 0)")) == "199990000"
+
+
+def test_let_tail_operator_once(capsys: pytest.CaptureFixture[str]):
+    text = "(let loop ((i 0)) (if (< i 3) (loop (+ i 1)) ((if (print 7) + -) i 10)))"
+    assert repr(Interpreter().interprete(text)) == "13"
+    assert capsys.readouterr().out.split() == ["7"]
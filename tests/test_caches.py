@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from sfpy import caches
+from sfpy.caches import SourceCache
+from sfpy.parsers import Parser
+
+
+def read(cache: SourceCache, source: Path) -> list[str]:
+    return [repr(form) for form in cache.read(source, Parser())]
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    result = tmp_path / "main.scm"
+    result.write_text("(define x 1)\n(+ x 2)\n")
+    return result
+
+
+def test_hit(source: Path, tmp_path: Path):
+    cache = SourceCache(tmp_path / "cache")
+    assert read(cache, source) == ["( define x 1 )", "( + x 2 )"]
+    assert read(cache, source) == ["( define x 1 )", "( + x 2 )"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_next_to_source(source: Path):
+    cache = SourceCache()
+    read(cache, source)
+    assert cache.path(source.resolve()).parent == source.parent / "__sfpycache__"
+    read(cache, source)
+    assert cache.hits == 1
+
+
+def test_invalidate_on_mtime(source: Path, tmp_path: Path):
+    cache = SourceCache(tmp_path / "cache")
+    read(cache, source)
+    stat = source.stat()
+    source.write_text("(define x 3)\n(+ x 2)\n")  # same size
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert read(cache, source) == ["( define x 3 )", "( + x 2 )"]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_invalidate_on_size(source: Path, tmp_path: Path):
+    cache = SourceCache(tmp_path / "cache")
+    read(cache, source)
+    stat = source.stat()
+    source.write_text("(define x 10)\n(+ x 2)\n")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # same modification time
+    assert read(cache, source) == ["( define x 10 )", "( + x 2 )"]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_invalidate_on_version(source: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache = SourceCache(tmp_path / "cache")
+    read(cache, source)
+    monkeypatch.setattr(caches, "__version__", "0.0.0-other")
+    assert read(cache, source) == ["( define x 1 )", "( + x 2 )"]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_batches(source: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(SourceCache, "batch", 1)
+    source.write_text("".join(f"(+ {i} 1)\n" for i in range(5)))
+    cache = SourceCache(tmp_path / "cache")
+    expected = [f"( + {i} 1 )" for i in range(5)]
+    assert read(cache, source) == expected
+    assert read(cache, source) == expected
+    assert cache.hits == 1
@@ -0,0 +1,26 @@
+import pytest
+
+from sfpy.interpreters import Interpreter
+
+ENGINES = ["tree", "closure"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("text, expected", [
+    ("(define do (lambda (x) (* x 2))) (do 5)", "10"),
+    ("(define let (lambda (x) (+ x 1))) (let 5)", "6"),
+    ("(define while (lambda (x) x)) (while #f)", "#f"),
+    ("(define if (lambda (a b) b)) (if #f 1)", "1"),
+    ("(define f (lambda (n) (let () (define do (lambda (x) (* x 3))) (do n)))) (f 3)", "9"),
+])
+def test_rebound_forms(engine: str, text: str, expected: str):
+    assert repr(Interpreter(engine).interprete(text)) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_forms_before_rebinding(engine: str):
+    interpreter = Interpreter(engine)
+    interpreter.interprete("(define sign (lambda (n) (if (< n 0) -1 1)))")
+    assert repr(interpreter.interprete("(sign 3)")) == "1"
+    interpreter.interprete("(define if (lambda (a b c) 0))")
+    assert repr(interpreter.interprete("(sign 3)")) == "0"
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from sfpy.exceptions import FuelExhausted
+from sfpy.interpreters import Interpreter
+
+ENGINES = ["tree", "closure"]
+
+
+def interpreter(engine: str) -> Interpreter:
+    result = Interpreter(engine)
+    result.interprete("(define sq (lambda (x) (* x x)))")
+    result.interprete("(define spin (lambda (n) (while #t n)))")
+    return result
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("text, expected", [
+    ("(sq 5)", "25"),
+    ("(map (lambda (x) (sq x)) (list 1 2))", "(1 4)"),
+    ("(do ((i 0 (+ i 1))) ((= i 2) (sq i)))", "4"),
+    ("(let loop ((i 0) (acc 0)) (if (= i 100) acc (loop (+ i 1) (+ acc i))))", "4950"),
+])
+def test_preloaded(engine: str, text: str, expected: str):
+    assert repr(asyncio.run(interpreter(engine).interpreteAsync(text))) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("text", ["(spin 1)", "(map spin (list 1))"])
+def test_timeout(engine: str, text: str):
+    with pytest.raises(TimeoutError):
+        asyncio.run(interpreter(engine).interpreteAsync(text, timeout=0.2))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("text", ["(spin 1)", "(let loop ((i 0)) (loop (+ i 1)))", "(do ((i 0 (+ i 1))) (#f))"])
+def test_fuel(engine: str, text: str):
+    with pytest.raises(FuelExhausted):
+        asyncio.run(interpreter(engine).interpreteAsync(text, fuel=10000))
@@ -0,0 +1,68 @@
+import pytest
+
+from sfpy import functions
+from sfpy.interpreters import Interpreter
+
+ENGINES = ["tree", "closure"]
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(functions, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_memo_fib(engine: str):
+    interpreter = Interpreter(engine)
+    interpreter.interprete("(define-memo fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))")
+    assert repr(interpreter.interprete("(fib 60)")) == "1548008755920"
+    assert repr(interpreter.interprete("(memo-stats fib)")) == "(58 61 61)"
+
+
+def test_lru_eviction():
+    interpreter = Interpreter()
+    interpreter.interprete("(define sq (memo-lambda (x) (* x x) 2))")
+    for text in ["(sq 1)", "(sq 2)", "(sq 1)", "(sq 3)"]:  # 2 is the least recently used
+        interpreter.interprete(text)
+    assert repr(interpreter.interprete("(memo-stats sq)")) == "(1 3 2)"
+    interpreter.interprete("(sq 1)")
+    interpreter.interprete("(sq 2)")
+    assert repr(interpreter.interprete("(memo-stats sq)")) == "(2 4 2)"
+
+
+def test_ttl_expiry(clock: list[float]):
+    interpreter = Interpreter()
+    interpreter.interprete("(define-memo sq (x) (* x x) 16 10)")
+    interpreter.interprete("(sq 3)")
+    clock[0] += 5
+    assert repr(interpreter.interprete("(sq 3)")) == "9"
+    assert repr(interpreter.interprete("(memo-stats sq)")) == "(1 1 1)"
+    clock[0] += 6
+    assert repr(interpreter.interprete("(sq 3)")) == "9"
+    assert repr(interpreter.interprete("(memo-stats sq)")) == "(1 2 1)"
+
+
+def test_clear():
+    interpreter = Interpreter()
+    interpreter.interprete("(define-memo sq (x) (* x x))")
+    interpreter.interprete("(sq 3)")
+    interpreter.interprete("(sq 3)")
+    interpreter.interprete("(memo-clear sq)")
+    assert repr(interpreter.interprete("(memo-stats sq)")) == "(0 0 0)"
+    interpreter.interprete("(sq 3)")
+    assert repr(interpreter.interprete("(memo-stats sq)")) == "(0 1 1)"
+
+
+@pytest.mark.parametrize("text", ["(memo-lambda (x) x 0)", "(memo-lambda (x) x 1 -1)", "(memo-lambda (x) x 1.5)"])
+def test_invalid_options(text: str):
+    with pytest.raises(AssertionError):
+        Interpreter().interprete(text)
+
+
+def test_unhashable_arguments():
+    interpreter = Interpreter()
+    interpreter.interprete("(define-memo first (v) (vector-ref v 0))")
+    assert repr(interpreter.interprete("(first (vector 4 5))")) == "4"
+    assert repr(interpreter.interprete("(memo-stats first)")) == "(0 0 0)"
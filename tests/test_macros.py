@@ -0,0 +1,48 @@
+import pytest
+
+from sfpy.interpreters import Interpreter
+from sfpy.macros import Macro
+
+ENGINES = ["tree", "closure"]
+
+TWICE = "(define twice (macro (e) (+ e e)))"
+
+
+def interpreter(engine: str, expandMacros: bool = False) -> Interpreter:
+    result = Interpreter(engine, expandMacros)
+    result.interprete(TWICE)
+    return result
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_expansion_per_call_site(engine: str):
+    interp = interpreter(engine)
+    interp.interprete("(define f (lambda (x) (+ (twice x) (twice 1))))")
+    for _ in range(3):
+        assert repr(interp.interprete("(f 2)")) == "6"
+    macro: Macro = interp.evaluator.symbols["twice"]
+    assert len(macro.expansions) == 2
+    expansions = list(macro.expansions.values())
+    interp.interprete("(f 3)")
+    assert all(a is b for a, b in zip(expansions, macro.expansions.values()))
+
+
+def test_expansion_eviction(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(Macro, "maxsize", 2)
+    interp = interpreter("tree")
+    for i in range(4):
+        assert repr(interp.interprete(f"(twice {i})")) == str(2 * i)
+    assert len(interp.evaluator.symbols["twice"].expansions) == 2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("expandMacros", [False, True])
+def test_arity_errors(engine: str, expandMacros: bool):
+    interp = interpreter(engine, expandMacros)
+    interp.interprete("(define f (lambda (x) (twice x)))")
+    assert repr(interp.interprete("(f 2)")) == "4"
+    with pytest.raises(AssertionError, match="number of operands"):
+        interp.interprete("(twice 1 2)")
+    with pytest.raises(AssertionError, match="number of operands"):
+        interp.interprete("(twice)")
+    assert repr(interp.interprete("(f 3)")) == "6"
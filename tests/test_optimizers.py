@@ -0,0 +1,24 @@
+import pytest
+
+from sfpy.interpreters import Interpreter
+
+ENGINES = ["tree", "closure"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fold(engine: str):
+    interpreter = Interpreter(engine, optimize=True)
+    assert repr(interpreter.load("(+ (* 2 3) (^ 2 2))")) == "10"
+    assert repr(interpreter.load("(if (< 1 2) (f 1) (f 2))")) == "( f 1 )"
+    assert repr(interpreter.load("((lambda (i) (* i x)) 3)")) == "( * 3 x )"
+    assert repr(interpreter.load("(define + -) (+ 1 2)")) == "( define + - ) ( + 1 2 )"
+    assert repr(interpreter.load("(/ 1 0)")) == "( / 1 0 )"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_rebound_after_lambda(engine: str):
+    interpreter = Interpreter(engine, optimize=True)
+    interpreter.interprete("(define f (lambda (x) (+ x (* 2 3))))")
+    assert repr(interpreter.interprete("(f 1)")) == "7"
+    interpreter.interprete("(define * (lambda (a b) 0))")
+    assert repr(interpreter.interprete("(f 1)")) == "1"
@@ -0,0 +1,75 @@
+import pytest
+
+from sfpy.exceptions import InvalidInput
+from sfpy.interpreters import Interpreter
+from sfpy.parsers import Parser
+
+SOURCE = """(define sq (lambda (x) ; squares
+  (* x x)))
+(sq 3) "a \\"b\\"
+c" ; trailing
+(+ 1.5 2) #t #f"""
+
+
+def forms(text: str) -> list[str]:
+    return [repr(form) for form in Parser().nocheck(text).items]
+
+
+@pytest.mark.parametrize("text, line, column", [
+    ("(+ 1 2))", 1, 8),
+    ("(+ 1\n  (* 2 3)", 1, 1),
+    ('(print "a\nb)', 1, 8),
+])
+def test_syntax_error_positions(text: str, line: int, column: int):
+    with pytest.raises(InvalidInput) as info:
+        Parser().nocheck(text)
+    assert (info.value.line, info.value.column) == (line, column)
+
+
+def test_undefined_symbol_position():
+    with pytest.raises(AssertionError, match="Undefined symbol: 'y' at line 2, column 6"):
+        Interpreter().interprete("(define x 1)\n(+ x y)")
+
+
+@pytest.mark.parametrize("text, expected", [
+    (r'"a\"b"', 'a"b'),
+    (r'"a\\b"', "a\\b"),
+    (r'"a\nb\tc"', "a\nb\tc"),
+    ('"a\nb"', "a\nb"),
+    (r'"\q"', "q"),
+])
+def test_string_escapes(text: str, expected: str):
+    assert Interpreter().interprete(text).raw == expected
+
+
+def test_comments():
+    assert forms("; a comment\n(+ 1 2) ; another\n;(+ 3 4)") == ["( + 1 2 )"]
+    assert repr(Interpreter().interprete('(print ";") ; (error)')) == "<empty>"
+
+
+def test_positions():
+    items = Parser().nocheck(SOURCE).items
+    assert [(item.line, item.column) for item in items] == [(1, 1), (3, 1), (3, 8), (5, 1), (5, 11), (5, 14)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16])
+def test_reader_chunks(size: int):
+    expected = Parser().nocheck(SOURCE).items
+
+    reader = Parser().reader()
+    items = []
+    for i in range(0, len(SOURCE), size):
+        items += reader.feed(SOURCE[i:i + size])
+    items += reader.close()
+
+    assert [repr(item) for item in items] == [repr(item) for item in expected]
+    assert [(item.line, item.column) for item in items] == [(item.line, item.column) for item in expected]
+    assert [item.value.raw for item in items if hasattr(item, "value")] == [item.value.raw for item in expected if hasattr(item, "value")]
+
+
+def test_reader_lines():
+    reader = Parser().reader()
+    assert reader.feed("(define sq\n") == []
+    assert reader.depth == 1 and not reader.complete
+    assert [repr(form) for form in reader.feed("  (lambda (x) (* x x)))\n")] == ["( define sq ( lambda ( x ) ( * x x ) ) )"]
+    assert reader.complete
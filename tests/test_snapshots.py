@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from sfpy.interpreters import Interpreter
+from sfpy.snapshots import Snapshot
+
+ENGINES = ["tree", "closure"]
+
+PRELUDE = """(define base 10)
+(define sq (lambda (x) (* x x)))
+(define add (lambda (n) (lambda (x) (+ x n base))))
+(define-memo fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+(define twice (macro (e) (+ e e)))
+(define root math:sqrt)
+"""
+
+
+@pytest.fixture
+def prelude(tmp_path: Path) -> Path:
+    result = tmp_path / "prelude.scm"
+    result.write_text(PRELUDE)
+    return result
+
+
+def loaded(engine: str, prelude: Path) -> Interpreter:
+    interpreter = Interpreter(engine)
+    interpreter.interprete(prelude.read_text())
+    return interpreter
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_save_restore(engine: str, prelude: Path, tmp_path: Path):
+    snapshot = Snapshot(tmp_path / "prelude.snapshot")
+    snapshot.save(loaded(engine, prelude), [prelude])
+    assert snapshot.skipped == {}
+
+    interpreter = Interpreter(engine)
+    assert snapshot.restore(interpreter, [prelude])
+    for text, expected in [("(sq 4)", "16"), ("((add 1) 2)", "13"), ("(fib 30)", "832040"), ("(twice 3)", "6"), ("(root 16)", "4.0")]:
+        assert repr(interpreter.interprete(text)) == expected
+    interpreter.interprete("(define base 20)")
+    assert repr(interpreter.interprete("((add 1) 2)")) == "23"
+
+
+def test_stale(prelude: Path, tmp_path: Path):
+    snapshot = Snapshot(tmp_path / "prelude.snapshot")
+    snapshot.save(loaded("tree", prelude), [prelude])
+    assert not snapshot.restore(Interpreter("closure"), [prelude])
+    prelude.write_text(PRELUDE + "(define extra 1)\n")
+    assert not snapshot.restore(Interpreter("tree"), [prelude])
+    assert not Snapshot(tmp_path / "missing.snapshot").restore(Interpreter("tree"), [prelude])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_skip_unpicklable(engine: str, prelude: Path, tmp_path: Path):
+    interpreter = loaded(engine, prelude)
+    interpreter.interprete("(define lock (threading:Lock))")
+    snapshot = Snapshot(tmp_path / "prelude.snapshot")
+    snapshot.save(interpreter, [prelude])
+    assert list(snapshot.skipped) == ["lock"]
+
+    interpreter = Interpreter(engine)
+    assert snapshot.restore(interpreter, [prelude])
+    assert repr(interpreter.interprete("(sq 5)")) == "25"
+    assert "lock" not in interpreter.evaluator.symbols
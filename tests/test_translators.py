@@ -0,0 +1,75 @@
+import pytest
+
+from sfpy.functions import Lambda
+from sfpy.interpreters import Interpreter
+from sfpy.translators import Translator
+
+
+@pytest.fixture
+def interpreter(monkeypatch: pytest.MonkeyPatch) -> Interpreter:
+    monkeypatch.setattr(Lambda, "threshold", 10)
+    return Interpreter()
+
+
+def native(interpreter: Interpreter, name: str):
+    return interpreter.evaluator.symbols[name].native
+
+
+def test_promote_callers(interpreter: Interpreter):
+    interpreter.interprete("(define g (lambda (x) (* x 2)))")
+    interpreter.interprete("(define f (lambda (x) (+ (g x) 1)))")
+    interpreter.interprete("(define run (lambda (n acc) (if (= n 0) acc (run (- n 1) (+ acc (f n))))))")
+    assert repr(interpreter.interprete("(run 100 0)")) == "10200"
+    for name in ["g", "f", "run"]:
+        assert native(interpreter, name) is not None
+
+
+@pytest.mark.parametrize("text, calls", [
+    ("(define even (lambda (n) (if (= n 0) #t (if (= n 1) #f (even (- n 2))))))", {"(even 10)": "#t", "(even 7)": "#f"}),
+    ("(define even (lambda (n) (if (< n 2) (= n 0) (and #t (even (- n 2))))))", {"(even 10)": "#t", "(even 7)": "#f"}),
+])
+def test_bool_results(interpreter: Interpreter, text: str, calls: dict[str, str]):
+    interpreter.interprete(text)
+    for _ in range(20):
+        for call, expected in calls.items():
+            assert repr(interpreter.interprete(call)) == expected
+    assert native(interpreter, "even") is not None
+
+
+def test_guard_fallback(interpreter: Interpreter):
+    interpreter.interprete("(define size (lambda (x) (if (= x 0) 0 1)))")
+    for _ in range(20):
+        interpreter.interprete("(size 2)")
+    assert native(interpreter, "size") is not None
+    assert repr(interpreter.interprete('(size "a")')) == "1"
+    assert native(interpreter, "size") is not None
+
+
+def test_demote_on_redefinition(interpreter: Interpreter):
+    interpreter.interprete("(define g (lambda (x) (* x 2)))")
+    interpreter.interprete("(define f (lambda (x) (+ (g x) 1)))")
+    for _ in range(20):
+        interpreter.interprete("(f 1)")
+    assert native(interpreter, "f") is not None
+
+    interpreter.interprete("(define g (lambda (x) (* x 3)))")
+    assert repr(interpreter.interprete("(f 1)")) == "4"
+    assert native(interpreter, "f") is None
+    for _ in range(20):
+        interpreter.interprete("(f 1)")
+    assert native(interpreter, "f") is not None
+    assert repr(interpreter.interprete("(f 2)")) == "7"
+
+
+def test_bounded_reports(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(Translator, "maxsize", 2)
+    translator = Translator()
+    interpreter = Interpreter()
+    for i in range(4):
+        interpreter.interprete(f"(define f{i} (lambda (x) (+ x {i})))")
+        interpreter.interprete(f'(define g{i} (lambda (x) (print x)))')
+        translator.translate(interpreter.evaluator.symbols[f"f{i}"])
+        translator.translate(interpreter.evaluator.symbols[f"g{i}"])
+    assert list(translator.promoted) == ["f2", "f3"]
+    assert list(translator.rejected) == ["g2", "g3"]
+    assert translator.stats() == {"promoted": 4, "rejected": 4}